@@ -0,0 +1,163 @@
+"""
+End-to-end benchmarks of the extractor, QA and analyst graphs over the golden
+Chinook questions.
+
+    pytest benchmarks/bench_agents.py --benchmark-columns=min,mean,max
+    SQL_ASSISTANT_CASSETTE_LATENCY_S=0.5 pytest benchmarks/bench_agents.py
+
+Named bench_*.py so the default pytest run does not collect it. The LLM is a
+cassette, recorded from the scripted golden model on the first run and replayed
+afterwards, with SQL_ASSISTANT_CASSETTE_LATENCY_S of synthetic latency per call
+(none by default, so the timings are the overhead of our own code). Query,
+artifact and report caches are cleared before every round. Per node timings are
+attached to each benchmark's extra_info and summarised at the end of the session.
+The analyst goldens are also run once in a checkpointed thread.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Must be set before sql_assistant.config is imported
+os.environ.setdefault("SQL_ASSISTANT_LLM_CACHE", "0")
+os.environ.setdefault(
+    "SQL_ASSISTANT_CASSETTE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cassettes", "chinook.json")
+)
+os.environ.setdefault(
+    "SQL_ASSISTANT_CHECKPOINT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cassettes", "checkpoints.db")
+)
+
+from golden import GoldenChatModel, load_golden  # noqa: E402
+from sql_assistant.cassette import Cassette, CassetteChatModel  # noqa: E402
+from sql_assistant.config import CASSETTE_LATENCY_S, CASSETTE_PATH, chat  # noqa: E402
+from sql_assistant.metrics import NODE_SECONDS, metrics  # noqa: E402
+from sql_assistant.registry import get_registry  # noqa: E402
+from sql_assistant.result_store import ResultStore  # noqa: E402
+
+GOLDEN = load_golden()
+
+
+@pytest.fixture(scope="session")
+def llm():
+    golden_model = GoldenChatModel(golden=GOLDEN)
+    model = CassetteChatModel(
+        model_id=chat,
+        cassette=Cassette(CASSETTE_PATH),
+        mode="record",
+        inner=golden_model,
+        latency_s=CASSETTE_LATENCY_S
+    )
+    get_registry().register_llm(model, chat)
+    return model
+
+
+@pytest.fixture(scope="session")
+def agents(llm, tmp_path_factory):
+    from sql_assistant.QA.chat import SQLAgent
+    from sql_assistant.analyst.chat import DataAnalyst
+    from sql_assistant.extractor.chat import ExtractorAgent
+
+    agents = {"extractor": ExtractorAgent(), "qa": SQLAgent(), "analyst": DataAnalyst()}
+    for name, agent in agents.items():
+        agent.results = ResultStore(tmp_path_factory.mktemp(f"results-{name}"))
+
+    # Record any missing cassette entries outside of the timed rounds
+    for item in GOLDEN:
+        agent = agents[item["agent"]]
+        agent.invoke(item["question"], **_inputs(item))
+    return agents
+
+
+@pytest.fixture(scope="session", autouse=True)
+def node_summary(request):
+    yield
+    reporter = request.config.pluginmanager.get_plugin("terminalreporter")
+    series = NODE_SECONDS.series()
+    if reporter is None or not series:
+        return
+
+    capture = request.config.pluginmanager.get_plugin("capturemanager")
+    with capture.global_and_fixture_disabled():
+        reporter.write_sep("-", "per node timings (all rounds)")
+        for (agent, node), stats in sorted(series.items()):
+            reporter.write_line(
+                f"{agent:<16} {node:<18} n={stats['count']:<5} "
+                f"mean={stats['mean'] * 1000:8.2f}ms  p95={stats['p95'] * 1000:8.2f}ms"
+            )
+
+
+def _inputs(item):
+    return {"export_format": item["format"]} if "format" in item else {}
+
+
+def _clear_caches(agent):
+    agent.db.cache.clear()
+    shutil.rmtree(agent.results.root, ignore_errors=True)
+    agent.results.root.mkdir(parents=True, exist_ok=True)
+    if hasattr(agent, "reports"):
+        agent.reports.cache.clear()
+
+
+@pytest.mark.parametrize("item", GOLDEN, ids=[item["id"] for item in GOLDEN])
+def test_end_to_end(benchmark, agents, item):
+    agent = agents[item["agent"]]
+    before = {key: stats["sum"] for key, stats in NODE_SECONDS.series().items()}
+
+    state = benchmark.pedantic(
+        lambda: agent.invoke(item["question"], **_inputs(item)),
+        setup=lambda: _clear_caches(agent),
+        rounds=5,
+        iterations=1
+    )
+
+    rounds = benchmark.stats.stats.rounds if benchmark.stats else 1
+    benchmark.extra_info["nodes_ms"] = {
+        node: round((stats["sum"] - before.get((name, node), 0.0)) / rounds * 1000, 3)
+        for (name, node), stats in NODE_SECONDS.series().items()
+        if name == agent.name
+    }
+    result = state['result']
+    assert state['query'].text == item["sql"]
+    assert result.row_count == item["rows"]
+    if item["agent"] == "analyst":
+        assert state['analysis'].analysis_type.value == item["analysis_type"]
+        assert "Plotly.newPlot" in state['messages'][-1].content
+    if item.get("format") == "parquet":
+        # Columnar extracts hold exactly what sqlite returned, mixed int/float columns too
+        import pyarrow.parquet as pq
+
+        with sqlite3.connect(agent.db.db_path) as conn:
+            rows = conn.execute(item["sql"]).fetchall()
+        expected = [list(column) for column in zip(*rows)]
+        assert list(pq.read_table(result.output).to_pydict().values()) == expected
+
+
+@pytest.mark.parametrize(
+    "item",
+    load_golden(agent="analyst"),
+    ids=[item["id"] for item in load_golden(agent="analyst")]
+)
+def test_checkpointed_analysis(agents, item):
+    """Every analysis, temporal figures included, survives a checkpoint of its thread."""
+    agent = agents["analyst"]
+    thread_id = f"bench-{item['id']}"
+    agent.checkpointer.delete_thread(thread_id)
+
+    state = agent.invoke(item["question"], thread_id)
+    assert "Plotly.newPlot" in state['messages'][-1].content
+
+    saved = agent.graph.get_state(agent.thread_config(thread_id)).values
+    assert saved['analysis'].analysis_type.value == item["analysis_type"]
+    assert isinstance(saved['analysis'].figure, str)
+    assert saved['result'].row_count == item["rows"]
+
+
+def test_metrics_render(benchmark, agents):
+    """Cost of serving /metrics once every histogram has data."""
+    text = benchmark(metrics.render)
+    assert "sql_assistant_node_seconds_bucket" in text
@@ -0,0 +1,68 @@
+"""
+Golden Chinook questions and a scripted chat model answering them.
+
+The scripted model stands in for the LLM when a cassette is recorded offline:
+generation and correction prompts get the golden SQL, reviews are CORRECT and
+answer prompts get the golden answer of the question they mention.
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+GOLDEN_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "golden", "chinook.jsonl"
+)
+
+
+def load_golden(
+    path: str = GOLDEN_PATH, agent: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    with open(path) as file:
+        golden = [json.loads(line) for line in file if line.strip()]
+    return [item for item in golden if agent is None or item["agent"] == agent]
+
+
+class GoldenChatModel(BaseChatModel):
+    golden: List[Dict[str, Any]]
+    default_answer: str = "Your results are ready."
+
+    @property
+    def _llm_type(self) -> str:
+        return "golden"
+
+
+    def _match(self, text: str) -> Optional[Dict[str, Any]]:
+        # Longest question first, some questions are prefixes of others
+        for item in sorted(self.golden, key=lambda item: -len(item["question"])):
+            if item["question"] in text or item["sql"] in text:
+                return item
+        return None
+
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        system = " ".join(m.content for m in messages if m.type == "system")
+        text = "\n".join(m.content for m in messages if isinstance(m.content, str))
+        item = self._match(text)
+
+        if "Start with CORRECT, INCORRECT or INVALID" in text:
+            return "CORRECT" if item is not None else "INVALID: no query was provided."
+        generating = "return only the SQL query" in system
+        if generating or "Provide only the corrected query" in text:
+            return item["sql"] if item is not None else "invalid request"
+        if "ANALYSIS_TYPE" in system:
+            default = "ANALYSIS_TYPE: DISTRIBUTION"
+            return item.get("analysis", default) if item is not None else default
+        if item is None:
+            return self.default_answer
+        return item.get("answer", self.default_answer)
+
+
+    def _generate(
+        self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        message = AIMessage(content=self._respond(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
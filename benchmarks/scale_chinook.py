@@ -0,0 +1,115 @@
+"""
+Generate Chinook-shaped databases at larger scale factors.
+
+    python benchmarks/scale_chinook.py 10 100 1000 --out data/db/scaled
+
+A scale factor of N keeps the dimension tables (artists, albums, genres, media
+types, employees, playlists) and replicates customers, invoices, invoice_items
+and tracks N times. Copy k offsets every primary key by k times the original
+maximum and remaps the foreign keys between the replicated tables the same way,
+so each copy is a self-contained, referentially intact Chinook. Copies get a
+distinct customer email and shifted invoice dates so group-bys see more keys.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DB = os.path.join(ROOT, "data", "db", "chinook.db")
+SCALED_DIR = os.path.join(ROOT, "data", "db", "scaled")
+
+# table -> (primary key, column expressions of copy k, with {pk}, {customers}, ... offsets)
+REPLICATED = {
+    "tracks": (
+        "TrackId",
+        "TrackId + k * {tracks}, Name, AlbumId, MediaTypeId, GenreId, Composer, "
+        "Milliseconds, Bytes, UnitPrice",
+    ),
+    "customers": (
+        "CustomerId",
+        "CustomerId + k * {customers}, FirstName, LastName, Company, Address, City, State, "
+        "Country, PostalCode, Phone, Fax, k || '.' || Email, SupportRepId",
+    ),
+    "invoices": (
+        "InvoiceId",
+        "InvoiceId + k * {invoices}, CustomerId + k * {customers}, "
+        "datetime(InvoiceDate, '+' || (k % 365) || ' days'), BillingAddress, BillingCity, "
+        "BillingState, BillingCountry, BillingPostalCode, Total",
+    ),
+    "invoice_items": (
+        "InvoiceLineId",
+        "InvoiceLineId + k * {invoice_items}, InvoiceId + k * {invoices}, "
+        "TrackId + k * {tracks}, UnitPrice, Quantity",
+    ),
+}
+
+
+def scaled_path(scale: int, out_dir: str = SCALED_DIR) -> str:
+    return os.path.join(out_dir, f"chinook_x{scale}.db")
+
+
+def generate(
+    scale: int, out_dir: str = SCALED_DIR, source: str = SOURCE_DB, force: bool = False
+) -> str:
+    """Write chinook_x<scale>.db into out_dir and return its path, reuses an existing one."""
+    path = scaled_path(scale, out_dir)
+    if os.path.exists(path) and not force:
+        return path
+
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.copyfile(source, tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        offsets = {
+            table: conn.execute(f"SELECT max({pk}) FROM {table}").fetchone()[0]
+            for table, (pk, _) in REPLICATED.items()
+        }
+
+        conn.execute("CREATE TEMP TABLE copies (k INTEGER PRIMARY KEY)")
+        conn.executemany("INSERT INTO copies VALUES (?)", [(k,) for k in range(1, scale)])
+
+        # Parents first, the originals are the rows up to the recorded maximum key
+        for table in ("tracks", "customers", "invoices", "invoice_items"):
+            pk, columns = REPLICATED[table]
+            conn.execute(
+                f"INSERT INTO {table} SELECT {columns.format(**offsets)} "
+                f"FROM copies, {table} WHERE {pk} <= {offsets[table]} ORDER BY k, {pk}"
+            )
+        conn.commit()
+
+        violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+        if violations:
+            raise RuntimeError(f"Scaled database breaks {len(violations)} foreign keys")
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate scaled Chinook databases")
+    parser.add_argument(
+        "scales", nargs="+", type=int, help="Scale factors, e.g. 10 100 1000"
+    )
+    parser.add_argument("--out", default=SCALED_DIR)
+    parser.add_argument("--force", action="store_true", help="Regenerate existing files")
+    args = parser.parse_args()
+
+    for scale in args.scales:
+        start = time.perf_counter()
+        path = generate(scale, args.out, force=args.force)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"x{scale}: {path} ({size_mb:.1f} MB) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Cold start benchmark of the entry points.
+
+    python benchmarks/startup.py               # compare against startup_budget.json
+    python benchmarks/startup.py --update      # record the current timings as the budget
+
+Every measurement runs in a fresh interpreter: the import time of the entry
+point module and the latency of the first request through a new agent. The
+LLM is replaced by a canned chat model so only our own startup is timed.
+Exits with status 1 when a median exceeds its budget by more than the tolerance
+or when an entry point fails to start at all.
+The budget is machine specific, re-record it with --update on the CI runner.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_budget.json")
+
+# name -> (module imported by the entry point, expression building its agent)
+ENTRY_POINTS = {
+    "extractor": ("sql_assistant.extractor.chat", "module.ExtractorAgent()"),
+    "qa": ("sql_assistant.QA.chat", "module.SQLAgent()"),
+    "analyst": ("sql_assistant.analyst.chat", "module.DataAnalyst()"),
+    "batch": ("sql_assistant.batch", "module.ExtractorAgent()"),
+    "api": ("sql_assistant.extractor.improvements.download_file", "module.agent"),
+    "streamlit": ("sql_assistant.extractor.serving", "module.load_agent()"),
+}
+
+REQUEST = "List the names of all genres"
+
+CHILD = """
+import time
+import sql_assistant.utils as utils
+
+def load_llm_chat(model, **params):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    return FakeListChatModel(responses=["SELECT Name FROM genres", "Done."])
+
+utils.load_llm_chat = load_llm_chat
+
+import importlib, json
+start = time.perf_counter()
+module = importlib.import_module({module!r})
+imported = time.perf_counter()
+
+agent = {agent}
+# Time the request itself, not a lookup in the on-disk LLM cache of previous runs
+for chain in vars(agent.chains).values():
+    if hasattr(chain, "cache"):
+        chain.cache = None
+agent.invoke({request!r})
+done = time.perf_counter()
+
+print(json.dumps({{"import_s": imported - start, "first_request_s": done - imported}}))
+"""
+
+
+def measure(name: str) -> Optional[Dict[str, float]]:
+    module, agent = ENTRY_POINTS[name]
+    code = CHILD.format(module=module, agent=agent, request=REQUEST)
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    proc = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr else ""
+        print(f"{name}: failed\n{error}")
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run(names, repeat: int) -> Tuple[Dict[str, Dict[str, float]], List[str]]:
+    """Median timings per entry point, and the entry points that failed a run."""
+    results, failed = {}, []
+    for name in names:
+        samples = [measure(name) for _ in range(repeat)]
+        if not all(samples):
+            # A crash is a regression, a median of the surviving runs would hide it
+            failed.append(name)
+            continue
+        results[name] = {
+            metric: statistics.median(sample[metric] for sample in samples)
+            for metric in ("import_s", "first_request_s")
+        }
+        print(
+            f"{name:<10} import {results[name]['import_s']:.3f}s"
+            f"  first request {results[name]['first_request_s']:.3f}s"
+        )
+    return results, failed
+
+
+def compare(results: Dict[str, Dict[str, float]], budget: Dict) -> bool:
+    tolerance = budget.get("tolerance", 1.25)
+    # Absolute allowance so timer noise on very short phases is not a regression
+    slack = budget.get("slack_s", 0.05)
+    ok = True
+    for name, metrics in results.items():
+        if name not in budget.get("entry_points", {}):
+            # An unbudgeted entry point would be measured and never compared
+            print(f"MISSING {name}: no budget recorded, re-record with --update")
+            ok = False
+            continue
+        for metric, value in metrics.items():
+            limit = budget["entry_points"][name].get(metric)
+            if limit is not None and value > limit * tolerance + slack:
+                print(
+                    f"REGRESSION {name} {metric}: {value:.3f}s > "
+                    f"{limit:.3f}s x {tolerance} + {slack}s"
+                )
+                ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start of the entry points")
+    parser.add_argument("entry_points", nargs="*", default=list(ENTRY_POINTS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget", default=BUDGET_PATH)
+    parser.add_argument(
+        "--update", action="store_true", help="Write the timings as the budget"
+    )
+    args = parser.parse_args()
+
+    results, failed = run(args.entry_points, args.repeat)
+    for name in failed:
+        print(f"REGRESSION {name}: failed to start")
+
+    budget = {}
+    if os.path.exists(args.budget):
+        with open(args.budget) as file:
+            budget = json.load(file)
+
+    if args.update:
+        if failed:
+            # Never record a budget that silently drops the entry points that crashed
+            sys.exit(1)
+        budget.setdefault("tolerance", 1.25)
+        budget.setdefault("slack_s", 0.05)
+        budget.setdefault("entry_points", {}).update(
+            {name: {k: round(v, 3) for k, v in m.items()} for name, m in results.items()}
+        )
+        with open(args.budget, "w") as file:
+            json.dump(budget, file, indent=2)
+            file.write("\n")
+        return
+
+    sys.exit(0 if compare(results, budget) and not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
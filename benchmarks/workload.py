@@ -0,0 +1,165 @@
+"""
+Database workload benchmark over scaled Chinook databases.
+
+    python benchmarks/workload.py --scales 1 10 100 --repeat 5 --json data/workload.json
+
+For every scale factor and operation a fresh interpreter runs the representative
+queries below through DatabaseConnection (execute_query, extract_query and
+extract_to_file) and reports latency, throughput and the peak RSS of that
+process. The query result cache is cleared before every run, so apart from one
+untimed warm-up per query the numbers are for uncached executions. Databases
+are generated on demand by scale_chinook.py.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scale_chinook import ROOT, SCALED_DIR, generate  # noqa: E402
+
+QUERIES = {
+    "revenue_by_country": (
+        "SELECT BillingCountry, COUNT(*) AS Invoices, SUM(Total) AS Revenue "
+        "FROM invoices GROUP BY BillingCountry ORDER BY Revenue DESC"
+    ),
+    "top_customers": (
+        "SELECT c.CustomerId, c.FirstName, c.LastName, "
+        "SUM(ii.UnitPrice * ii.Quantity) AS Spent "
+        "FROM customers c JOIN invoices i ON i.CustomerId = c.CustomerId "
+        "JOIN invoice_items ii ON ii.InvoiceId = i.InvoiceId "
+        "GROUP BY c.CustomerId ORDER BY Spent DESC LIMIT 100"
+    ),
+    "genre_sales": (
+        "SELECT g.Name, COUNT(*) AS Lines, SUM(ii.Quantity) AS Units "
+        "FROM invoice_items ii JOIN tracks t ON t.TrackId = ii.TrackId "
+        "JOIN genres g ON g.GenreId = t.GenreId GROUP BY g.GenreId"
+    ),
+    "invoice_lines": (
+        "SELECT ii.InvoiceLineId, i.InvoiceDate, i.BillingCountry, t.Name, "
+        "ii.UnitPrice, ii.Quantity "
+        "FROM invoice_items ii JOIN invoices i ON i.InvoiceId = ii.InvoiceId "
+        "JOIN tracks t ON t.TrackId = ii.TrackId"
+    ),
+    "track_catalog": (
+        "SELECT t.TrackId, t.Name, al.Title, ar.Name AS Artist, t.Milliseconds, t.UnitPrice "
+        "FROM tracks t JOIN albums al ON al.AlbumId = t.AlbumId "
+        "JOIN artists ar ON ar.ArtistId = al.ArtistId"
+    ),
+}
+
+# operation -> queries it runs
+OPERATIONS = {
+    "execute_query": ["revenue_by_country", "top_customers", "genre_sales"],
+    "extract_query": ["invoice_lines", "track_catalog"],
+    "extract_to_file_csv": ["invoice_lines", "track_catalog"],
+    "extract_to_file_parquet": ["invoice_lines", "track_catalog"],
+}
+
+
+def run_child(db_path: str, operation: str, repeat: int) -> Dict:
+    """Run one operation's queries in this process and measure them."""
+    from sql_assistant.database import DatabaseConnection
+
+    db = DatabaseConnection(db_path)
+    out_dir = tempfile.mkdtemp(prefix="workload-")
+    results = {}
+
+    for name in OPERATIONS[operation]:
+        query = QUERIES[name]
+        latencies, rows = [], 0
+        # Round 0 is a warm-up that pays for the pandas/pyarrow imports and is not timed
+        for i in range(repeat + 1):
+            db.cache.clear()
+            start = time.perf_counter()
+            if operation == "execute_query":
+                rows = len(db.execute_query(query))
+            elif operation == "extract_query":
+                rows = len(db.extract_query(query))
+            else:
+                export_format = operation.rsplit("_", 1)[-1]
+                path = os.path.join(out_dir, f"{name}.{i}.{export_format}")
+                rows = db.extract_to_file(query, path, export_format).row_count
+                os.remove(path)
+            if i:
+                latencies.append(time.perf_counter() - start)
+
+        total = sum(latencies)
+        results[name] = {
+            "rows": rows,
+            "mean_s": statistics.mean(latencies),
+            "p50_s": statistics.median(latencies),
+            "max_s": max(latencies),
+            "queries_per_s": repeat / total if total else None,
+            "rows_per_s": rows * repeat / total if total else None,
+        }
+
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    return {"queries": results, "peak_rss_mb": peak_mb}
+
+
+def run(scales: List[int], operations: List[str], repeat: int, out_dir: str) -> Dict:
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    report = {}
+    for scale in scales:
+        db_path = generate(scale, out_dir)
+        report[scale] = {}
+        for operation in operations:
+            command = [
+                sys.executable, __file__, "--child", db_path, operation,
+                "--repeat", str(repeat)
+            ]
+            proc = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"x{scale} {operation}: failed\n{proc.stderr}")
+                continue
+
+            measured = json.loads(proc.stdout.strip().splitlines()[-1])
+            report[scale][operation] = measured
+            for name, stats in measured["queries"].items():
+                print(
+                    f"x{scale:<5} {operation:<24} {name:<20} rows={stats['rows']:<9} "
+                    f"mean={stats['mean_s'] * 1000:9.1f}ms  "
+                    f"rows/s={stats['rows_per_s'] or 0:12,.0f}  "
+                    f"peak_rss={measured['peak_rss_mb']:.0f}MB"
+                )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="DatabaseConnection workload per scale factor"
+    )
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100])
+    parser.add_argument(
+        "--operations", nargs="+", default=list(OPERATIONS), choices=list(OPERATIONS)
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--db-dir", default=SCALED_DIR)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument(
+        "--child", nargs=2, metavar=("DB", "OPERATION"), help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child[0], args.child[1], args.repeat)))
+        return
+
+    report = run(args.scales, args.operations, args.repeat, args.db_dir)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
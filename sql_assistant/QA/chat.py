@@ -1,29 +1,66 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from langchain_core.messages import AIMessage
 from langgraph.graph import END, StateGraph
 from langgraph.graph.state import CompiledStateGraph
 
 from sql_assistant.query import QueryStatus
-from sql_assistant.chains import Chains
+from sql_assistant.config import QA_ROW_LIMIT, RESULT_PROMPT_TOKENS
 from sql_assistant.state import AgentState
 from sql_assistant.base import SQLBaseAgent
+from sql_assistant.schema_index import estimate_tokens
 
 
 class SQLAgent(SQLBaseAgent):
-    def __init__(self):
-        super().__init__()
-        self.chains = Chains()
+    stream_nodes = ("generate_response",)
+
+    def __init__(self, result_prompt_tokens: int = RESULT_PROMPT_TOKENS):
+        super().__init__(row_limit=QA_ROW_LIMIT)
+        self.result_prompt_tokens = result_prompt_tokens
         self.graph = self._build_graph()
 
         # self.graph.get_graph().draw_mermaid_png(output_file_path="QAgraph.png")
 
 
+    def _result_preview(self, state: AgentState) -> str:
+        """Leading rows of the result within RESULT_PROMPT_TOKENS, the rest only counted."""
+        rows = self._result_data(state) or []
+        lines, budget = [], self.result_prompt_tokens
+        for row in rows:
+            line = str(row)
+            budget -= estimate_tokens(line)
+            if budget < 0 and lines:
+                break
+            lines.append(line)
+
+        preview = "\n".join(lines)
+        if len(lines) < len(rows):
+            preview += f"\n... {len(rows) - len(lines)} more rows, {len(rows)} in total"
+        return preview
+
+
+    def _generate_response_inputs(self, state: AgentState) -> Dict[str, Any]:
+        return {
+            "messages": self.memory.prompt_messages(state["messages"]),
+            "input": state["user_input"],
+            "sql_result": self._result_preview(state)
+        }
+
+
     def _generate_response(self, state: AgentState) -> Dict[str, Any]:
         """Generate natural language response from SQL results"""
-        output_message = self.chains.sql_output_chain.invoke({
-            "messages": state["messages"],
-            "input": state["user_input"],
-            "sql_result": state["result"]
-        })
+        output_message = self.chains.sql_output_chain.invoke(
+            self._generate_response_inputs(state)
+        )
+        state['messages'].append(AIMessage(content=output_message))
+
+        return state
+
+
+    async def _agenerate_response(self, state: AgentState) -> Dict[str, Any]:
+        output_message = await self.chains.sql_output_chain.ainvoke(
+            self._generate_response_inputs(state)
+        )
+        state['messages'].append(AIMessage(content=output_message))
 
         return state
 
@@ -31,12 +68,17 @@ class SQLAgent(SQLBaseAgent):
     def _build_graph(self) -> CompiledStateGraph:
         workflow = StateGraph(AgentState)
 
-        workflow.add_node("generate", self._generate)
-        workflow.add_node("review", self._review)
-        workflow.add_node("correct", self._correct)
-        workflow.add_node("execute", self._execute)
-        workflow.add_node("generate_response", self._generate_response)
+        workflow.add_node("compact", self._node(self._compact_memory))
+        workflow.add_node("generate", self._node(self._generate, self._agenerate))
+        workflow.add_node("review", self._node(self._review, self._areview))
+        workflow.add_node("correct", self._node(self._correct, self._acorrect))
+        workflow.add_node("execute", self._node(self._execute))
+        workflow.add_node(
+            "generate_response",
+            self._node(self._generate_response, self._agenerate_response)
+        )
 
+        workflow.add_edge("compact", "generate")
         workflow.add_edge("generate", "review")
         workflow.add_conditional_edges(
             "review",
@@ -52,23 +94,34 @@ class SQLAgent(SQLBaseAgent):
         workflow.add_conditional_edges(
             "execute",
             lambda x: x['query'].status,
-            {QueryStatus.NEEDS_REVIEW: "review", QueryStatus.READY: "format_output"}
+            {
+                QueryStatus.NEEDS_REVIEW: "review",
+                QueryStatus.COMPLETE: "generate_response",
+                QueryStatus.FAILED: END,
+                QueryStatus.BUDGET_EXCEEDED: END
+            }
         )
-        workflow.add_edge("format_output", END)
-        workflow.set_entry_point("generate")
+        workflow.add_edge("generate_response", END)
+        workflow.set_entry_point("compact")
 
         
-        return workflow.compile()
+        return workflow.compile(checkpointer=self.checkpointer)
 
 
-    def run(self, query: str) -> str:
+    def run(self, query: str, thread_id: Optional[str] = None) -> str:
         """Process a natural language query and return response"""
-        result_state = self.graph.invoke({"messages": query}, self.state_config)
+        result_state = self.invoke(query, thread_id)
         response = result_state['messages'][-1].content
 
         return response
 
 
+    async def arun(self, query: str, thread_id: Optional[str] = None) -> str:
+        """Async version of run, LLM waits of concurrent requests overlap."""
+        result_state = await self.ainvoke(query, thread_id)
+        return result_state['messages'][-1].content
+
+
 # Example usage
 if __name__ == "__main__":
     agent = SQLAgent()
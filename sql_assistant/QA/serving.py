@@ -1,8 +1,16 @@
+import streamlit as st
+
 from sql_assistant.front_layer import AgentUI
 from sql_assistant.QA.chat import SQLAgent
 
 
+@st.cache_resource
+def load_agent() -> SQLAgent:
+    # Streamlit re-runs this script on every interaction, build the agent once
+    return SQLAgent()
+
+
 if __name__=='__main__':
-    agent = SQLAgent()
+    agent = load_agent()
     ui = AgentUI(agent)
     ui.app()
\ No newline at end of file
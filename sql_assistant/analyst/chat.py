@@ -1,61 +1,223 @@
-import pandas as pd
-import plotly.express as px
+from __future__ import annotations
 
-from typing import List, Dict, Any
-from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+from langchain_core.messages import AIMessage, BaseMessage
 from langgraph.graph import StateGraph, END
 from langgraph.graph.state import CompiledStateGraph
 
-from sql_assistant.chains import Chains
-from sql_assistant.query import SQLQuery, QueryStatus
-from sql_assistant.state import AgentState, AnalysisType
+from sql_assistant.config import ANALYST_PUSHDOWN, ANALYST_ROW_LIMIT, PLOTLY_JS
+from sql_assistant.guard import QueryBudgetExceeded
+from sql_assistant.handles import handles
+from sql_assistant.query import QueryResult, QueryStatus, subquery
+from sql_assistant.state import AgentState, AnalysisResult, AnalysisType
 from sql_assistant.base import SQLBaseAgent
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from sql_assistant.analyst.pushdown import FrameSource, QuerySource
+    from sql_assistant.analyst.reduction import PlotBudget
+    from sql_assistant.analyst.report import ReportRenderer
+
+
+# Reflection types the charts do not distinguish
+ANALYSIS_ALIASES = {
+    "comparison": AnalysisType.AGGREGATION,
+    "composition": AnalysisType.AGGREGATION,
+}
+
 
 class DataAnalyst(SQLBaseAgent):
-    def __init__(self,):
-        super().__init__()
-        self.chains = Chains()
+    def __init__(
+        self,
+        plot_budget: Optional[PlotBudget] = None,
+        pushdown: bool = ANALYST_PUSHDOWN,
+        plotly_js: str = PLOTLY_JS
+    ):
+        super().__init__(row_limit=ANALYST_ROW_LIMIT)
+        self.plot_budget = plot_budget
+        self.pushdown = pushdown
+        self.plotly_js = plotly_js
+        self._reports: Optional[ReportRenderer] = None
         self.graph = self._build_graph()
 
         # self.graph.get_graph().draw_mermaid_png(output_file_path="DA_graph.png")
 
 
+    @property
+    def reports(self) -> ReportRenderer:
+        """Report renderer and its cache, built with the first report (it needs numpy)."""
+        if self._reports is None:
+            from sql_assistant.analyst.report import ReportRenderer
+
+            self._reports = ReportRenderer(self.plotly_js)
+        return self._reports
+
+
+    def _execute(self, state: AgentState) -> AgentState:
+        """
+        With pushdown only count the rows, the analysis computes its aggregates in SQL
+        later. Otherwise fetch the result as a DataFrame.
+        """
+        try:
+            if self.pushdown:
+                query = subquery(state['query'].text)
+                rows = self.db.execute_query(f"SELECT COUNT(*) FROM {query}")
+                row_count = rows[0][0] if rows else 0
+                state['result'] = QueryResult(success=bool(row_count), row_count=row_count)
+            else:
+                query = self.db.guard.limit(state['query'].text, self.row_limit)
+                df = self._fetch_rows(query)
+                state['result'] = QueryResult(
+                    success=not df.empty,
+                    handle=handles.put(df),
+                    row_count=len(df),
+                    columns=list(df.columns)
+                )
+                if len(df) == self.row_limit:
+                    self.log(f"Result truncated to {self.row_limit} rows")
+        except QueryBudgetExceeded as e:
+            return self._budget_exceeded(state, e)
+
+        if state['result'].success:
+            self.log(f"Query execution succeeded, {state['result'].row_count} rows")
+            state['query'].status = QueryStatus.COMPLETE
+            return state
+
+        self.warn("Query execution failed")
+        state['query'].retry_count += 1
+        state['messages'].append(AIMessage(content="Error executing query: Check Langsmith"))
+        if state['query'].retry_count >= self.max_retries:
+            state['query'].status = QueryStatus.FAILED
+        else:
+            state['query'].status = QueryStatus.NEEDS_REVIEW
+        return state
+
+
+    def _fetch_rows(self, query: str) -> pd.DataFrame:
+        return self.db.extract_query(query)
+
+
+    def _source(self, state: AgentState) -> Union[FrameSource, QuerySource]:
+        from sql_assistant.analyst.pushdown import FrameSource, QuerySource
+
+        if state['result'].handle is not None:
+            return FrameSource(self._result_data(state))
+        return QuerySource(self.db, state['query'].text, state['result'].row_count)
+
+
     def _create_visualization(
         self,
-        df: pd.DataFrame,
+        source: Union[FrameSource, QuerySource],
         analysis_type: AnalysisType,
         viz_type: str
-    ) -> Dict[str, Any]:
-        """Create visualization using Plotly."""
+    ) -> Tuple[Any, List[str]]:
+        """
+        Create visualization using Plotly.
+        Results within the plot budget are plotted row by row. Larger ones are reduced
+        first: binned, summarised or grouped by the source (in SQL for a QuerySource),
+        sampled, or fetched and decimated. Returns the figure and a note per reduction.
+        """
+        # plotly is heavy and only the analyst charts need it, import on first chart
+        import plotly.express as px
+        import plotly.graph_objects as go
+        from sql_assistant.analyst import reduction
+
+        budget = self.plot_budget or reduction.PlotBudget()
+        large = source.row_count > budget.max_points
+        df = None
+        if not large or analysis_type == AnalysisType.TEMPORAL:
+            df = source.frame(self.row_limit)
+        first_numeric = source.numeric[0] if source.numeric else source.columns[0]
+        notes = []
+
+        def note(text: Optional[str]):
+            if text:
+                notes.append(text)
+
+        def render_mode(points: int) -> str:
+            if points > budget.webgl_threshold:
+                note(f"WebGL rendering for {points:,} points")
+                return "webgl"
+            return "svg"
+
         if analysis_type == AnalysisType.TEMPORAL:
-            fig = px.line(df, x=df.columns[0], y=df.columns[1:])
-            
+            if len(df) < source.row_count:
+                note(f"Plotting the first {len(df):,} of {source.row_count:,} rows")
+            x = df.columns[0]
+            ys = [c for c in df.select_dtypes(include=['number']).columns if c != x]
+            df = reduction.parse_dates(df, x)
+            if not ys:
+                # Nothing numeric to draw over time, count the rows per time value instead
+                df = df.groupby(x, sort=True).size().reset_index(name="count")
+                ys = ["count"]
+                note(f"Rows counted per {x}, the result has no numeric column")
+            df, reduced = reduction.decimate(df, x, ys, budget)
+            note(reduced)
+            fig = px.line(df, x=x, y=ys, render_mode=render_mode(len(df) * len(ys)))
+
         elif analysis_type == AnalysisType.CORRELATION:
             if viz_type == 'heatmap':
-                corr = df.corr()
+                if large:
+                    note(
+                        f"Correlation of {source.row_count:,} rows "
+                        f"computed in {source.engine}"
+                    )
+                    corr = source.correlation(source.numeric)
+                else:
+                    corr = df.corr(numeric_only=True)
                 fig = px.imshow(corr, 
                               labels=dict(color="Correlation"),
                               x=corr.columns,
                               y=corr.columns)
             else:
+                # scatter_matrix is a WebGL splom already, only the row count matters
+                if large:
+                    df, sampled = source.sample(budget.scatter_sample)
+                    note(sampled)
                 fig = px.scatter_matrix(df)
-                
-        elif analysis_type == AnalysisType.DISTRIBUTION:
-            if viz_type == 'histogram':
-                fig = px.histogram(df, x=df.columns[0])
+
+        elif analysis_type == AnalysisType.DISTRIBUTION and viz_type == 'histogram':
+            if large and first_numeric in source.numeric:
+                bins = source.histogram(first_numeric, budget.hist_bins)
+                note(
+                    f"Pre-binned {source.row_count:,} rows into {budget.hist_bins} bins "
+                    f"in {source.engine}"
+                )
+                fig = px.bar(
+                    bins, x="bin_center", y="count", labels={"bin_center": first_numeric}
+                )
+                fig.update_traces(width=bins["bin_end"] - bins["bin_start"])
+                fig.update_layout(bargap=0)
             else:
-                fig = px.box(df, y=df.columns[0])
-                
+                df = source.frame(self.row_limit) if df is None else df
+                fig = px.histogram(df, x=first_numeric, nbins=budget.hist_bins)
+
         elif analysis_type == AnalysisType.AGGREGATION:
-            fig = px.bar(df, x=df.columns[0], y=df.columns[1])
-            
-        else:  # DESCRIPTIVE
-            if df.select_dtypes(include=['number']).shape[1] > 0:
-                numeric_col = df.select_dtypes(include=['number']).columns[0]
-                fig = px.box(df, y=numeric_col)
+            x = source.columns[0]
+            y = source.columns[1] if len(source.columns) > 1 else x
+            if large:
+                df, top = source.top_categories(x, y, budget.max_categories)
             else:
-                fig = px.bar(df.iloc[:, 0].value_counts())
+                df, top = reduction.top_categories(df, x, y, budget.max_categories)
+            note(top)
+            fig = px.bar(df, x=x, y=y if y in source.numeric else "count")
+
+        elif source.numeric:
+            # DISTRIBUTION box plots and DESCRIPTIVE
+            if large:
+                note(f"Box plot computed from the quartiles of {source.row_count:,} rows in "
+                     f"{source.engine}, outliers not drawn")
+                box = source.box(first_numeric)
+                fig = go.Figure(go.Box(name=first_numeric, boxpoints=False, **box))
+            else:
+                fig = px.box(df, y=first_numeric)
+
+        else:
+            counts, total = source.value_counts(source.columns[0], budget.max_categories)
+            if total > budget.max_categories:
+                note(f"Showing the top {budget.max_categories} of {total:,} values")
+            fig = px.bar(counts)
 
         # Update layout for better presentation
         fig.update_layout(
@@ -70,13 +232,12 @@ class DataAnalyst(SQLBaseAgent):
             margin=dict(t=100, l=50, r=50, b=50)
         )
 
-        return fig
+        return fig, notes
 
 
-    def _analyze_data(self, df: pd.DataFrame, state: AgentState) -> Dict[str, Any]:
-        """Determine and perform appropriate analysis on the data."""
+    def _plan(self, state: AgentState) -> Dict[str, str]:
         analysis_plan = self.chains.analysis_reflection.invoke(
-            {"input": state['user_input']}
+            {"question": state['user_input']}
         )
 
         # Parse recommendation
@@ -84,22 +245,48 @@ class DataAnalyst(SQLBaseAgent):
         for line in analysis_plan.split('\n'):
             if ':' in line:
                 key, value = line.split(':', 1)
-                plan_parts[key.strip()] = value.strip()
-                
-        analysis_type = AnalysisType(plan_parts.get('ANALYSIS_TYPE', 'descriptive').lower())
-        viz_type = plan_parts.get('VISUALIZATION', 'bar').lower()
-        description = plan_parts.get('DESCRIPTION', '')
-        
+                plan_parts[key.strip().upper()] = value.strip().strip('[]')
+        return plan_parts
+
+
+    def _analyze_data(
+        self, source: Union[FrameSource, QuerySource], state: AgentState
+    ) -> AnalysisResult:
+        """Determine and perform appropriate analysis on the data."""
+        plan = self._plan(state)
+
+        name = plan.get('ANALYSIS_TYPE', 'descriptive').lower()
+        try:
+            analysis_type = ANALYSIS_ALIASES.get(name) or AnalysisType(name)
+        except ValueError:
+            analysis_type = AnalysisType.DESCRIPTIVE
+        viz_type = plan.get('VISUALIZATION', 'bar').lower()
+
         # Create visualization data
-        fig = self._create_visualization(df, analysis_type, viz_type)
-        
-        return fig
+        fig, reductions = self._create_visualization(source, analysis_type, viz_type)
+        for reduction in reductions:
+            self.log(f"Plot data reduced: {reduction}")
+
+        return AnalysisResult(
+            analysis_type=analysis_type,
+            visualization=viz_type,
+            description=plan.get('RATIONALE') or plan.get('DESCRIPTION', ''),
+            figure=fig,
+            row_count=source.row_count,
+            columns=source.columns,
+            reductions=reductions,
+            plan=plan
+        )
 
 
     def _analyze(self, state: AgentState) -> AgentState:
         """Perform analysis on the query results."""
-        if state['result'] is not None and not state['result'].empty:
-            analysis_result = self._analyze_data(state['result'])
+        result = state['result']
+        if result is not None and result.row_count:
+            try:
+                analysis_result = self._analyze_data(self._source(state), state)
+            except QueryBudgetExceeded as e:
+                return self._budget_exceeded(state, e)
             state['analysis'] = analysis_result
             state['messages'].append(AIMessage(content=f"Analysis complete: {analysis_result.description}"))
         else:
@@ -110,67 +297,9 @@ class DataAnalyst(SQLBaseAgent):
     def _format_analysis(self, state: AgentState) -> AgentState:
         """Format the analysis results with embedded visualization."""
         if 'analysis' in state and state['analysis'] is not None:
-            analysis = state['analysis']
-            
-            # Convert the Plotly figure to HTML
-            html_content = f"""
-            <html>
-                <head>
-                    <title>Analysis Results</title>
-                    <script src="https://cdnjs.cloudflare.com/ajax/libs/plotly.js/2.24.3/plotly.min.js"></script>
-                    <style>
-                        body {{
-                            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
-                            margin: 0;
-                            padding: 20px;
-                            background-color: #f5f5f5;
-                        }}
-                        .container {{
-                            max-width: 1200px;
-                            margin: 0 auto;
-                            background-color: white;
-                            padding: 20px;
-                            border-radius: 8px;
-                            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                        }}
-                        .header {{
-                            margin-bottom: 20px;
-                        }}
-                        .plot {{
-                            width: 100%;
-                            height: 600px;
-                            margin: 20px 0;
-                        }}
-                        .metadata {{
-                            margin-top: 20px;
-                            padding: 15px;
-                            background-color: #f8f9fa;
-                            border-radius: 4px;
-                        }}
-                    </style>
-                </head>
-                <body>
-                    <div class="container">
-                        <div class="header">
-                            <h1>Analysis Results</h1>
-                            <p><strong>Analysis Type:</strong> {analysis.analysis_type.value}</p>
-                            <p><strong>Description:</strong> {analysis.description}</p>
-                        </div>
-                        <div id="plot" class="plot"></div>
-                        <div class="metadata">
-                            <h3>Data Summary</h3>
-                            <p>Rows: {state['result'].shape[0]}</p>
-                            <p>Columns: {state['result'].shape[1]}</p>
-                            <p>Analyzed columns: {', '.join(state['result'].columns)}</p>
-                        </div>
-                    </div>
-                    <script>
-                        {analysis.fig.to_json()}
-                    </script>
-                </body>
-            </html>
-            """
-            
+            html_content = self.reports.render(
+                state['analysis'], state['query'].text, self.db.version()
+            )
             state['messages'].append(AIMessage(content=html_content))
         else:
             state['messages'].append(AIMessage(content="Analysis could not be completed."))
@@ -180,14 +309,16 @@ class DataAnalyst(SQLBaseAgent):
     def _build_graph(self) -> CompiledStateGraph:
         workflow = StateGraph(AgentState)
 
-        workflow.add_node("generate", self._generate)
-        workflow.add_node("review", self._review)
-        workflow.add_node("correct", self._correct)
-        workflow.add_node("execute", self._execute)
-        workflow.add_node("analyze", self._analyze)
-        workflow.add_node("format_analysis", self._format_analysis)
+        workflow.add_node("compact", self._node(self._compact_memory))
+        workflow.add_node("generate", self._node(self._generate, self._agenerate))
+        workflow.add_node("review", self._node(self._review, self._areview))
+        workflow.add_node("correct", self._node(self._correct, self._acorrect))
+        workflow.add_node("execute", self._node(self._execute))
+        workflow.add_node("analyze", self._node(self._analyze))
+        workflow.add_node("format_analysis", self._node(self._format_analysis))
 
-        workflow.set_entry_point("generate")
+        workflow.set_entry_point("compact")
+        workflow.add_edge("compact", "generate")
         workflow.add_edge("generate", "review")
         workflow.add_conditional_edges(
             "review",
@@ -203,25 +334,40 @@ class DataAnalyst(SQLBaseAgent):
         workflow.add_conditional_edges(
             "execute",
             lambda x: x['query'].status,
-            {QueryStatus.NEEDS_REVIEW: "review", QueryStatus.ANALYZE: "analyze"}
+            {
+                QueryStatus.NEEDS_REVIEW: "review",
+                QueryStatus.COMPLETE: "analyze",
+                QueryStatus.FAILED: END,
+                QueryStatus.BUDGET_EXCEEDED: END
+            }
+        )
+        workflow.add_conditional_edges(
+            "analyze",
+            lambda x: x['query'].status,
+            {
+                QueryStatus.COMPLETE: "format_analysis",
+                QueryStatus.BUDGET_EXCEEDED: END
+            }
         )
-        workflow.add_edge("analyze", "format_analysis")
         workflow.add_edge("format_analysis", END)
 
-        return workflow.compile()
+        return workflow.compile(checkpointer=self.checkpointer)
 
 
-    def run(self, user_request: str) -> List[BaseMessage]:
+    def run(self, user_request: str, thread_id: Optional[str] = None) -> List[BaseMessage]:
         """
         Execute a SQL query based on the user request and return messages.
         Results will be available via the download endpoint.
         """
-        initial_state = AgentState(
-            messages=[HumanMessage(content=user_request)],
-            query=SQLQuery(text="", status=QueryStatus.PENDING)
-        )
+        final_state = self.invoke(user_request, thread_id)
+        return final_state['messages'][-1].content
+
 
-        final_state = self.graph.invoke(initial_state)
+    async def arun(
+        self, user_request: str, thread_id: Optional[str] = None
+    ) -> List[BaseMessage]:
+        """Async version of run, LLM waits of concurrent requests overlap."""
+        final_state = await self.ainvoke(user_request, thread_id)
         return final_state['messages'][-1].content
 
 
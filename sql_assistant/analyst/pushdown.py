@@ -0,0 +1,250 @@
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sql_assistant.analyst import reduction
+from sql_assistant.database import DatabaseConnection
+from sql_assistant.query import subquery
+
+# Rows fetched to find the result's columns and which of them are numeric
+PROFILE_ROWS = 100
+
+
+def quote(identifier: str) -> str:
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def literal(value: float) -> str:
+    """SQL literal of a number computed here, never of user input."""
+    return repr(float(value))
+
+
+class FrameSource:
+    """
+    Chart data computed in pandas from a result already in memory.
+    QuerySource is the pushdown twin with the same methods, the analyst builds its
+    figures from either.
+    """
+    engine = "pandas"
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.row_count = len(df)
+        self.columns = list(df.columns)
+        self.numeric = list(df.select_dtypes(include=['number']).columns)
+
+
+    def frame(self, limit: Optional[int] = None) -> pd.DataFrame:
+        return self.df if limit is None else self.df.head(limit)
+
+
+    def sample(self, n: int) -> Tuple[pd.DataFrame, Optional[str]]:
+        return reduction.sample(self.df, n)
+
+
+    def histogram(self, column: str, bins: int) -> pd.DataFrame:
+        return reduction.bin_counts(self.df[column], bins)
+
+
+    def box(self, column: str) -> dict:
+        return reduction.box_stats(self.df[column])
+
+
+    def correlation(self, columns: List[str]) -> pd.DataFrame:
+        return self.df[columns].corr()
+
+
+    def top_categories(
+        self, category: str, value: str, n: int
+    ) -> Tuple[pd.DataFrame, Optional[str]]:
+        return reduction.top_categories(self.df, category, value, n)
+
+
+    def value_counts(self, column: str, n: int) -> Tuple[pd.Series, int]:
+        counts = self.df[column].value_counts()
+        return counts.head(n), len(counts)
+
+
+class QuerySource:
+    """
+    Chart data computed by sqlite over the generated query as a subquery.
+    Only the aggregates (bins, quartiles, sums of products, groups) are fetched,
+    through DatabaseConnection.extract_query so they are guarded and cached.
+    """
+    engine = "SQL"
+
+    def __init__(self, db: DatabaseConnection, query: str, row_count: Optional[int] = None):
+        self.db = db
+        self.query = query.strip().rstrip(";").strip()
+        self.row_count = row_count if row_count is not None else self.count()
+
+        profile = self._fetch(f"SELECT * FROM {subquery(self.query)} LIMIT {PROFILE_ROWS}")
+        self.columns = list(profile.columns)
+        self.numeric = list(profile.select_dtypes(include=['number']).columns)
+        # Shift of the correlation sums, keeps them small enough to subtract safely
+        self._means = profile[self.numeric].mean().fillna(0.0).to_dict()
+
+
+    def _fetch(self, sql: str) -> pd.DataFrame:
+        return self.db.extract_query(sql)
+
+
+    def _from(self, *not_null: str) -> str:
+        sql = f"FROM {subquery(self.query)}"
+        if not_null:
+            sql += " WHERE " + " AND ".join(f"{quote(c)} IS NOT NULL" for c in not_null)
+        return sql
+
+
+    def count(self) -> int:
+        return int(self._fetch(f"SELECT COUNT(*) AS n {self._from()}")["n"].iloc[0])
+
+
+    def frame(self, limit: Optional[int] = None) -> pd.DataFrame:
+        return self._fetch(self.db.guard.limit(self.query, limit))
+
+
+    def sample(self, n: int) -> Tuple[pd.DataFrame, Optional[str]]:
+        """Every k-th row, deterministic so repeated analyses plot the same points."""
+        if self.row_count <= n:
+            return self.frame(), None
+
+        step = math.ceil(self.row_count / n)
+        columns = ", ".join(quote(c) for c in self.columns)
+        df = self._fetch(
+            f"SELECT {columns} FROM (SELECT *, row_number() OVER () AS _row {self._from()}) "
+            f"WHERE _row % {step} = 0 LIMIT {int(n)}"
+        )
+        return df, (
+            f"Sampled every {step}th row in SQL, {len(df):,} of {self.row_count:,} rows"
+        )
+
+
+    def histogram(self, column: str, bins: int) -> pd.DataFrame:
+        c = quote(column)
+        bounds = self._fetch(f"SELECT MIN({c}) AS lo, MAX({c}) AS hi {self._from(column)}")
+        lo, hi = bounds["lo"].iloc[0], bounds["hi"].iloc[0]
+        if pd.isna(lo):
+            return reduction.bin_counts(pd.Series([], dtype=float), bins)
+
+        lo, hi = float(lo), float(hi)
+        width = (hi - lo) / bins if hi > lo else 1.0
+        counts = self._fetch(
+            f"SELECT MIN(CAST(({c} - {literal(lo)}) / {literal(width)} AS INTEGER), "
+            f"{bins - 1}) AS bin, COUNT(*) AS count {self._from(column)} GROUP BY bin"
+        )
+
+        # Same layout as np.histogram, the last bin includes its right edge
+        edges = lo + width * np.arange(bins + 1)
+        full = np.zeros(bins, dtype=np.int64)
+        full[counts["bin"].to_numpy(dtype=np.int64)] = counts["count"].to_numpy()
+        return pd.DataFrame({
+            "bin_start": edges[:-1],
+            "bin_end": edges[1:],
+            "bin_center": (edges[:-1] + edges[1:]) / 2,
+            "count": full,
+        })
+
+
+    def box(self, column: str) -> dict:
+        c = quote(column)
+        stats = self._fetch(f"SELECT COUNT({c}) AS n, AVG({c}) AS mean {self._from(column)}")
+        n, mean = int(stats["n"].iloc[0]), stats["mean"].iloc[0]
+        if not n:
+            return reduction.box_stats(pd.Series([], dtype=float))
+
+        # Linear interpolation between order statistics, as np.percentile does
+        positions = {q: q * (n - 1) for q in (0.25, 0.5, 0.75)}
+        ranks = sorted({int(math.floor(p)) for p in positions.values()} |
+                       {int(math.ceil(p)) for p in positions.values()})
+        values = self._fetch(
+            f"SELECT _rank, v FROM (SELECT {c} AS v, "
+            f"row_number() OVER (ORDER BY {c}) - 1 AS _rank {self._from(column)}) "
+            f"WHERE _rank IN ({', '.join(map(str, ranks))})"
+        ).set_index("_rank")["v"].astype(float)
+
+        def percentile(q: float) -> float:
+            p = positions[q]
+            below, above = values[int(math.floor(p))], values[int(math.ceil(p))]
+            return below + (above - below) * (p - math.floor(p))
+
+        q1, median, q3 = percentile(0.25), percentile(0.5), percentile(0.75)
+        iqr = q3 - q1
+        fences = self._fetch(
+            f"SELECT MIN({c}) AS lo, MAX({c}) AS hi {self._from(column)} "
+            f"AND {c} BETWEEN {literal(q1 - 1.5 * iqr)} AND {literal(q3 + 1.5 * iqr)}"
+        )
+        return {
+            "q1": [q1],
+            "median": [median],
+            "q3": [q3],
+            "lowerfence": [fences["lo"].iloc[0]],
+            "upperfence": [fences["hi"].iloc[0]],
+            "mean": [mean],
+        }
+
+
+    def correlation(self, columns: List[str]) -> pd.DataFrame:
+        """Pearson correlation from shifted sums and sums of products, NULL rows skipped."""
+        shifted = [
+            f"(CAST({quote(c)} AS REAL) - {literal(self._means.get(c, 0.0))})"
+            for c in columns
+        ]
+        terms = ["COUNT(*) AS n"]
+        terms += [f"SUM({s}) AS s{i}" for i, s in enumerate(shifted)]
+        terms += [
+            f"SUM({shifted[i]} * {shifted[j]}) AS p{i}_{j}"
+            for i in range(len(columns)) for j in range(i, len(columns))
+        ]
+        row = self._fetch(f"SELECT {', '.join(terms)} {self._from(*columns)}").iloc[0]
+
+        n = float(row["n"])
+        k = len(columns)
+        sums = np.array([row[f"s{i}"] for i in range(k)], dtype=float)
+        products = np.empty((k, k))
+        for i in range(k):
+            for j in range(i, k):
+                products[i, j] = products[j, i] = row[f"p{i}_{j}"]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            covariance = products / n - np.outer(sums, sums) / (n * n)
+            deviation = np.sqrt(np.diag(covariance))
+            corr = covariance / np.outer(deviation, deviation)
+        return pd.DataFrame(np.clip(corr, -1.0, 1.0), index=columns, columns=columns)
+
+
+    def top_categories(
+        self, category: str, value: str, n: int
+    ) -> Tuple[pd.DataFrame, Optional[str]]:
+        c = quote(category)
+        # Text values cannot be summed, the bars count the rows of each category instead
+        if value in self.numeric:
+            v, aggregate, verb = quote(value), f"SUM({quote(value)})", "Summed"
+        else:
+            v, aggregate, verb = "count", "COUNT(*)", "Counted"
+
+        df = self._fetch(
+            f"SELECT {c}, {aggregate} AS {v}, COUNT(*) OVER () AS _groups {self._from()} "
+            f"GROUP BY {c} ORDER BY {v} DESC LIMIT {int(n)}"
+        )
+        groups = int(df["_groups"].iloc[0]) if len(df) else 0
+        notes = []
+        if groups < self.row_count:
+            notes.append(
+                f"{verb} {self.row_count:,} rows into {groups:,} {category} values in SQL"
+            )
+        if groups > n:
+            notes.append(f"Showing the top {n} of {groups:,} {category} values")
+        return df.drop(columns="_groups"), "; ".join(notes) or None
+
+
+    def value_counts(self, column: str, n: int) -> Tuple[pd.Series, int]:
+        c = quote(column)
+        df = self._fetch(
+            f"SELECT {c}, COUNT(*) AS count, COUNT(*) OVER () AS _values {self._from()} "
+            f"GROUP BY {c} ORDER BY count DESC LIMIT {int(n)}"
+        )
+        total = int(df["_values"].iloc[0]) if len(df) else 0
+        return df.set_index(column)["count"], total
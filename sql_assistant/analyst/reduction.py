@@ -0,0 +1,184 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sql_assistant.config import (
+    PLOT_DECIMATION,
+    PLOT_HIST_BINS,
+    PLOT_MAX_CATEGORIES,
+    PLOT_MAX_POINTS,
+    PLOT_SCATTER_SAMPLE,
+    PLOT_WEBGL_THRESHOLD,
+)
+
+
+@dataclass
+class PlotBudget:
+    """Limits applied to the data handed to plotly, see the PLOT_* settings."""
+    max_points: int = PLOT_MAX_POINTS
+    hist_bins: int = PLOT_HIST_BINS
+    scatter_sample: int = PLOT_SCATTER_SAMPLE
+    max_categories: int = PLOT_MAX_CATEGORIES
+    webgl_threshold: int = PLOT_WEBGL_THRESHOLD
+    decimation: str = PLOT_DECIMATION
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling, returns the indices of the kept points.
+    x must be sorted. First and last points are always kept.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket is the third vertex of the triangle
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+
+        bucket_x, bucket_y = x[start:end], y[start:end]
+        areas = np.abs(
+            (x[previous] - next_x) * (bucket_y - y[previous])
+            - (x[previous] - bucket_x) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        indices[i + 1] = previous
+
+    return indices
+
+
+def min_max(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Keep the minimum and maximum of n_out / 2 equal buckets, preserves spikes."""
+    n = len(y)
+    buckets = max(1, n_out // 2)
+    if n <= n_out:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    keep = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            chunk = y[start:end]
+            keep.extend((start + int(np.nanargmin(chunk)), start + int(np.nanargmax(chunk))))
+    return np.unique(keep)
+
+
+def _numeric_axis(values: pd.Series) -> np.ndarray:
+    """Position of each x value on a numeric axis, dates become nanoseconds."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float)
+
+    dates = pd.to_datetime(values, errors="coerce")
+    if dates.notna().all():
+        return dates.astype("int64").to_numpy(dtype=float)
+    return np.arange(len(values), dtype=float)
+
+
+def parse_dates(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    """Convert a text column of dates to datetime64, plotly then sends them compactly."""
+    dtype = df[column].dtype
+    if pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_datetime64_any_dtype(dtype):
+        return df
+    dates = pd.to_datetime(df[column], errors="coerce")
+    if dates.isna().any():
+        return df
+    return df.assign(**{column: dates})
+
+
+def decimate(
+    df: pd.DataFrame, x: str, ys: List[str], budget: PlotBudget
+) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Reduce a temporal frame to max_points rows, keeping the shape of every numeric
+    y series. Non-numeric columns do not drive the selection of points.
+    """
+    ys = [column for column in ys if pd.api.types.is_numeric_dtype(df[column])]
+    if len(df) <= budget.max_points or not ys:
+        return df, None
+
+    df = df.sort_values(x, kind="stable").reset_index(drop=True)
+    axis = _numeric_axis(df[x])
+    per_series = max(3, budget.max_points // len(ys))
+
+    keep = set()
+    for column in ys:
+        values = df[column].to_numpy(dtype=float)
+        if budget.decimation == "minmax":
+            keep.update(min_max(values, per_series).tolist())
+        else:
+            keep.update(lttb(axis, np.nan_to_num(values), per_series).tolist())
+
+    reduced = df.iloc[sorted(keep)]
+    note = (
+        f"{budget.decimation.upper()} decimation kept {len(reduced):,} of {len(df):,} points"
+    )
+    return reduced, note
+
+
+def bin_counts(values: pd.Series, bins: int) -> pd.DataFrame:
+    """Histogram of a numeric column as one row per bin."""
+    counts, edges = np.histogram(values.dropna().to_numpy(dtype=float), bins=bins)
+    return pd.DataFrame({
+        "bin_start": edges[:-1],
+        "bin_end": edges[1:],
+        "bin_center": (edges[:-1] + edges[1:]) / 2,
+        "count": counts,
+    })
+
+
+def box_stats(values: pd.Series) -> dict:
+    """Quartiles and Tukey fences, what a box trace needs without the raw points."""
+    values = values.dropna().to_numpy(dtype=float)
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    return {
+        "q1": [q1],
+        "median": [median],
+        "q3": [q3],
+        "lowerfence": [inside.min()],
+        "upperfence": [inside.max()],
+        "mean": [values.mean()],
+    }
+
+
+def sample(df: pd.DataFrame, n: int) -> Tuple[pd.DataFrame, Optional[str]]:
+    if len(df) <= n:
+        return df, None
+    return df.sample(n=n, random_state=0), f"Sampled {n:,} of {len(df):,} rows"
+
+
+def top_categories(
+    df: pd.DataFrame, category: str, value: str, n: int
+) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    At most n bars: repeated categories are summed and only the n largest are kept.
+    A non-numeric value is replaced by the row count of each category, "count".
+    """
+    notes = []
+    if not pd.api.types.is_numeric_dtype(df[value]):
+        rows = len(df)
+        counts = df[category].value_counts(sort=True)
+        df = counts.rename_axis(category).reset_index(name="count")
+        value = "count"
+        notes.append(f"Counted {rows:,} rows into {len(df):,} {category} values")
+    elif df[category].duplicated().any():
+        rows = len(df)
+        df = df.groupby(category, as_index=False, sort=False)[value].sum()
+        notes.append(f"Summed {rows:,} rows into {len(df):,} {category} values")
+
+    if len(df) > n:
+        total = len(df)
+        df = df.nlargest(n, value)
+        notes.append(f"Showing the top {n} of {total:,} {category} values")
+    return df, "; ".join(notes) or None
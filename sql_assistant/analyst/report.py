@@ -0,0 +1,208 @@
+import base64
+import html
+import json
+import os
+import shutil
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from sql_assistant.cache import ResultCache
+from sql_assistant.config import PLOTLY_JS, REPORT_CACHE_MAX_MB
+from sql_assistant.query import normalize_sql
+from sql_assistant.state import AnalysisResult
+
+# dtypes plotly.js decodes from {"dtype", "bdata"}, smallest first
+INT_DTYPES = ("i1", "u1", "i2", "u2", "i4", "u4")
+
+
+def plotly_bundle() -> str:
+    """Path of the plotly.min.js shipped with the installed plotly package."""
+    import plotly
+
+    return os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+
+
+def copy_plotly_bundle(directory: str) -> str:
+    """Copy plotly.min.js into directory unless an identical copy is already there."""
+    source = plotly_bundle()
+    target = os.path.join(directory, "plotly.min.js")
+    if not os.path.exists(target) or os.path.getsize(target) != os.path.getsize(source):
+        os.makedirs(directory, exist_ok=True)
+        shutil.copyfile(source, target)
+    return target
+
+
+def typed_array(values: Any) -> Any:
+    """
+    Base64 typed array of a numeric sequence, as understood by plotly.js >= 2.28.
+    Integral values use the smallest integer dtype that holds them, anything that
+    is not numeric is returned unchanged.
+    """
+    try:
+        array = np.asarray(values)
+    except (TypeError, ValueError):
+        # Ragged nested lists
+        return values
+    if array.dtype.kind not in "iuf" or array.ndim == 0 or array.size == 0:
+        return values
+
+    dtype = "f8"
+    integral = array.dtype.kind in "iu" or (
+        np.isfinite(array).all() and np.array_equal(array, np.round(array))
+    )
+    if integral:
+        low, high = array.min(), array.max()
+        dtype = next(
+            (d for d in INT_DTYPES if np.iinfo(d).min <= low and high <= np.iinfo(d).max),
+            "f8"
+        )
+
+    data = array.astype(np.dtype(dtype).newbyteorder("<")).tobytes()
+    encoded = {"dtype": dtype, "bdata": base64.b64encode(data).decode()}
+    if array.ndim > 1:
+        encoded["shape"] = ",".join(map(str, array.shape))
+    return encoded
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "bdata" in value:
+            return value
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        encoded = typed_array(value)
+        if encoded is not value:
+            return encoded
+        return [_encode(item) for item in value]
+    return value
+
+
+def _encode_dates(trace: Dict[str, Any], layout: Dict[str, Any]):
+    """
+    datetime64 x/y arrays as milliseconds since the epoch, half the size of date
+    strings. plotly.js only reads numbers as dates on an axis typed "date".
+    """
+    for axis in ("x", "y"):
+        values = trace.get(axis)
+        if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+            trace[axis] = values.astype("datetime64[ms]").astype(np.int64).astype(float)
+            ref = trace.get(f"{axis}axis", axis)
+            name = f"{axis}axis{ref[1:]}"
+            layout.setdefault(name, {})["type"] = "date"
+
+
+def encode_figure(fig: Any) -> str:
+    """
+    Compact JSON of a plotly figure with every numeric trace array as a typed array.
+    fig may also be the JSON text of a figure, as restored from a checkpoint.
+    """
+    from plotly.utils import PlotlyJSONEncoder
+
+    figure = fig.to_plotly_json() if hasattr(fig, "to_plotly_json") else json.loads(fig)
+    figure.setdefault("layout", {})
+    layout = figure["layout"]
+    for trace in figure["data"]:
+        _encode_dates(trace, layout)
+    payload = {"data": [_encode(trace) for trace in figure["data"]], "layout": layout}
+    text = json.dumps(payload, cls=PlotlyJSONEncoder, separators=(",", ":"))
+    # The JSON is inlined in a <script>, it must not be able to close it
+    return text.replace("</", "<\\/")
+
+
+class ReportRenderer:
+    """
+    HTML reports of the analyst, cached by result (normalized query and database
+    version) plus analysis plan.
+    plotly_js is "inline" to embed the bundle in every report, otherwise the URL
+    the report loads plotly.min.js from.
+    """
+
+    def __init__(self, plotly_js: str = PLOTLY_JS, max_mb: int = REPORT_CACHE_MAX_MB):
+        self.plotly_js = plotly_js
+        self.cache = ResultCache(max_mb * 1024 * 1024)
+        self._inline_bundle: Optional[str] = None
+
+
+    @staticmethod
+    def key(query: str, analysis: AnalysisResult) -> tuple:
+        return (
+            normalize_sql(query),
+            tuple(sorted(analysis.plan.items())),
+            analysis.analysis_type.value,
+            analysis.visualization,
+        )
+
+
+    def _script_tag(self) -> str:
+        if self.plotly_js != "inline":
+            return f'<script src="{html.escape(self.plotly_js)}"></script>'
+        if self._inline_bundle is None:
+            with open(plotly_bundle()) as file:
+                self._inline_bundle = file.read()
+        return f"<script>{self._inline_bundle}</script>"
+
+
+    def render(self, analysis: AnalysisResult, query: str, db_version: str) -> str:
+        key = self.key(query, analysis)
+        report = self.cache.get(key, db_version)
+        if report is None:
+            report = self._render(analysis)
+            self.cache.put(key, db_version, report)
+        return report
+
+
+    def _render(self, analysis: AnalysisResult) -> str:
+        reductions = ""
+        if analysis.reductions:
+            items = "".join(f"<li>{html.escape(note)}</li>" for note in analysis.reductions)
+            reductions = (
+                '<div class="metadata"><h3>Data reduction</h3>'
+                f"<p>The chart does not draw every row:</p><ul>{items}</ul></div>"
+            )
+        columns = html.escape(", ".join(map(str, analysis.columns)))
+
+        return f"""<html>
+<head>
+<title>Analysis Results</title>
+<meta charset="utf-8">
+{self._script_tag()}
+<style>
+body {{
+  font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue",
+    Arial, sans-serif;
+  margin: 0; padding: 20px; background-color: #f5f5f5;
+}}
+.container {{
+  max-width: 1200px; margin: 0 auto; background-color: white; padding: 20px;
+  border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+}}
+.header {{ margin-bottom: 20px; }}
+.plot {{ width: 100%; height: 600px; margin: 20px 0; }}
+.metadata {{
+  margin-top: 20px; padding: 15px; background-color: #f8f9fa; border-radius: 4px;
+}}
+</style>
+</head>
+<body>
+<div class="container">
+<div class="header">
+<h1>Analysis Results</h1>
+<p><strong>Analysis Type:</strong> {analysis.analysis_type.value}</p>
+<p><strong>Description:</strong> {html.escape(analysis.description)}</p>
+</div>
+<div id="plot" class="plot"></div>
+<div class="metadata">
+<h3>Data Summary</h3>
+<p>Rows: {analysis.row_count}</p>
+<p>Columns: {len(analysis.columns)}</p>
+<p>Analyzed columns: {columns}</p>
+</div>
+{reductions}
+</div>
+<script>
+const figure = {encode_figure(analysis.figure)};
+Plotly.newPlot("plot", figure.data, figure.layout, {{responsive: true}});
+</script>
+</body>
+</html>"""
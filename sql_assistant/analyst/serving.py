@@ -1,8 +1,22 @@
+import os
+import streamlit as st
+
 from sql_assistant.front_layer import AgentUI
 from sql_assistant.analyst.chat import DataAnalyst
+from sql_assistant.analyst.report import copy_plotly_bundle
+
+# Streamlit serves this directory under /app/static, see .streamlit/config.toml
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+
+@st.cache_resource
+def load_agent() -> DataAnalyst:
+    # Streamlit re-runs this script on every interaction, build the agent once
+    copy_plotly_bundle(STATIC_DIR)
+    return DataAnalyst(plotly_js="/app/static/plotly.min.js")
 
 
 if __name__=='__main__':
-    agent = DataAnalyst()
+    agent = load_agent()
     ui = AgentUI(agent)
     ui.app()
\ No newline at end of file
@@ -1,36 +1,354 @@
 import os
+import asyncio
 
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from langchain_core.messages import AIMessage
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 
-from sql_assistant.database import DatabaseConnection
-from sql_assistant.chains import Chains
-from sql_assistant.query import SQLQuery, QueryStatus
-from sql_assistant.config import FILEPATH, chat, path_db
-from sql_assistant.state import AgentState
-from sql_assistant.utils import load_llm_chat
+from sql_assistant.agent_log import AgentLog
+from sql_assistant.query import SQLQuery, QueryResult, QueryStatus, clean_sql, normalize_sql
+from sql_assistant.config import (
+    CANDIDATE_SELECTION,
+    CANDIDATE_TEMPERATURE,
+    CHECKPOINTS_ENABLED,
+    EXPORT_FORMAT,
+    LOCAL_VALIDATION,
+    SCHEMA_PRUNING,
+    SCHEMA_TOKEN_BUDGET,
+    SCHEMA_TOP_K,
+    SQL_CANDIDATES,
+    STREAM_EXTRACT,
+    chat,
+    path_db,
+    path_tables,
+)
+from sql_assistant.export import get_format
+from sql_assistant.guard import QueryBudgetExceeded
+from sql_assistant.handles import handles
+from sql_assistant.memory import MemoryPolicy
+from sql_assistant.metrics import CANDIDATE_PICKS, NODE_SECONDS, REQUESTS, SQL_RETRIES
+from sql_assistant.registry import get_chains, get_checkpointer, get_database
+from sql_assistant.result_store import ResultStore
+from sql_assistant.schema_index import SchemaIndex, estimate_tokens, load_descriptions
+from sql_assistant.state import AgentState, StreamEvent
+from sql_assistant.validator import SQLValidator, Verdict
 
 
-class SQLBaseAgent:
+FINAL_STATUSES = (QueryStatus.COMPLETE, QueryStatus.FAILED, QueryStatus.BUDGET_EXCEEDED)
+
+
+class SQLBaseAgent(AgentLog):
+    color = AgentLog.CYAN
+    # Nodes whose LLM output is the answer shown to the user, streamed token by token
+    stream_nodes: Tuple[str, ...] = ()
+    stream_modes = ["updates", "messages", "values"]
+
     def __init__(
         self,
         db_path: Path = path_db,
-        max_retries: int = 2
+        max_retries: int = 2,
+        stream_extract: bool = STREAM_EXTRACT,
+        schema_pruning: bool = SCHEMA_PRUNING,
+        schema_top_k: int = SCHEMA_TOP_K,
+        schema_token_budget: int = SCHEMA_TOKEN_BUDGET,
+        local_validation: bool = LOCAL_VALIDATION,
+        row_limit: Optional[int] = None,
+        memory: Optional[MemoryPolicy] = None,
+        checkpoints: bool = CHECKPOINTS_ENABLED,
+        candidates: int = SQL_CANDIDATES,
+        candidate_selection: str = CANDIDATE_SELECTION
     ):
+        self.name = type(self).__name__
         self.max_retries = max_retries
-        self.llm_chat = load_llm_chat(chat)
-        self.db = DatabaseConnection(db_path)
-        self.chains = Chains()
+        self.stream_extract = stream_extract
+        self.schema_pruning = schema_pruning
+        self.schema_top_k = schema_top_k
+        self.schema_token_budget = schema_token_budget
+        self._schema_index: Optional[SchemaIndex] = None
+        self._schema_index_version: Optional[int] = None
+        self.local_validation = local_validation
+        self.row_limit = row_limit
+        # Shared process-wide, building an agent does not create clients or connections
+        self.db = get_database(db_path)
+        self.chains = get_chains(chat)
+        self.validator = SQLValidator(self.db)
+        self.results = ResultStore()
+        self.memory = memory or MemoryPolicy(self.chains)
+        # Graphs are compiled with it, their state is saved per thread id after every node
+        self.checkpointer = get_checkpointer() if checkpoints else None
+        self._stateless_graph: Optional[Tuple[Any, Any]] = None
+        if candidate_selection not in ("first", "agreement"):
+            raise ValueError(
+                f"Unknown candidate selection {candidate_selection!r}, "
+                "expected 'first' or 'agreement'"
+            )
+        self.candidates = candidates
+        self.candidate_selection = candidate_selection
+        # Sampled alternatives to the regular generation, only built when they are used
+        self.candidate_chains = None
+        if candidates > 1:
+            self.candidate_chains = get_chains(
+                chat, temperature=CANDIDATE_TEMPERATURE, do_sample=True
+            )
 
 
-    def _generate(self, state: AgentState) -> AgentState:
+    def _node(
+        self,
+        func: Callable[[AgentState], AgentState],
+        afunc: Optional[Callable[[AgentState], Awaitable[AgentState]]] = None
+    ) -> RunnableLambda:
+        """
+        Graph node running func on invoke and afunc on ainvoke.
+        Without an async twin the sync implementation is offloaded to a worker thread.
+        Both are timed per node, see sql_assistant.metrics.
+        """
+        if afunc is None:
+            async def afunc(state: AgentState) -> AgentState:
+                return await asyncio.to_thread(func, state)
+
+        def timed(state: AgentState, config: RunnableConfig) -> AgentState:
+            node = config.get("metadata", {}).get("langgraph_node", func.__name__)
+            before = self._status(state)
+            with NODE_SECONDS.time(agent=self.name, node=node):
+                state = func(state)
+            self._record_outcome(state, before)
+            return state
+
+        async def atimed(state: AgentState, config: RunnableConfig) -> AgentState:
+            node = config.get("metadata", {}).get("langgraph_node", func.__name__)
+            before = self._status(state)
+            with NODE_SECONDS.time(agent=self.name, node=node):
+                state = await afunc(state)
+            self._record_outcome(state, before)
+            return state
+
+        return RunnableLambda(timed, afunc=atimed)
+
+
+    @staticmethod
+    def _status(state: AgentState) -> Optional[QueryStatus]:
+        query = state.get('query')
+        return query.status if query is not None else None
+
+
+    def _record_outcome(self, state: AgentState, before: Optional[QueryStatus]):
+        """Count the request once, in the node that moved its query to a final status."""
+        status = self._status(state)
+        if status in FINAL_STATUSES and before not in FINAL_STATUSES:
+            SQL_RETRIES.observe(state['query'].retry_count, agent=self.name)
+            REQUESTS.inc(agent=self.name, status=status.value)
+
+
+    def _initial_state(self, user_request: str) -> AgentState:
+        return AgentState(
+            messages=[HumanMessage(content=user_request)],
+            query=SQLQuery(text="", status=QueryStatus.PENDING),
+            # A thread keeps its state between requests, the last result is not this one's
+            result=None,
+            analysis=None
+        )
+
+
+    @staticmethod
+    def thread_config(thread_id: str) -> RunnableConfig:
+        """Graph config of a session."""
+        return {"configurable": {"thread_id": thread_id}}
+
+
+    def _target(self, thread_id: Optional[str]) -> Tuple[Any, RunnableConfig]:
+        """
+        Graph and config of a run. Only runs of a thread are checkpointed, a one-off
+        request could never be resumed and would pay a disk write per node for nothing.
+        """
+        if self.checkpointer is None:
+            return self.graph, {}
+        if thread_id is not None:
+            return self.graph, self.thread_config(thread_id)
+        if self._stateless_graph is None or self._stateless_graph[0] is not self.graph:
+            stateless = self.graph.copy(update={"checkpointer": None})
+            self._stateless_graph = (self.graph, stateless)
+        return self._stateless_graph[1], {}
+
+
+    def _resumes(self, snapshot: Any, user_request: str) -> bool:
+        """Whether the thread stopped in the middle of a run of this same request."""
+        if not snapshot.next:
+            return False
+        messages = snapshot.values.get('messages') or []
+        requests = [m.content for m in messages if isinstance(m, HumanMessage)]
+        request = requests[-1] if requests else None
+        return request == user_request
+
+
+    def _graph_input(
+        self, user_request: str, config: RunnableConfig, **inputs: Any
+    ) -> Optional[AgentState]:
+        """
+        Initial state of a new run, or None to resume the interrupted run of the same
+        request in the thread from its last completed node.
+        """
+        if config and self._resumes(self.graph.get_state(config), user_request):
+            self.log(f"Resuming thread {config['configurable']['thread_id']}")
+            return None
+        return self._initial_state(user_request, **inputs)
+
+
+    async def _agraph_input(
+        self, user_request: str, config: RunnableConfig, **inputs: Any
+    ) -> Optional[AgentState]:
+        if config and self._resumes(await self.graph.aget_state(config), user_request):
+            self.log(f"Resuming thread {config['configurable']['thread_id']}")
+            return None
+        return self._initial_state(user_request, **inputs)
+
+
+    def invoke(
+        self, user_request: str, thread_id: Optional[str] = None, **inputs: Any
+    ) -> AgentState:
+        """Run the graph for the request, in the thread if one is given, return its state."""
+        graph, config = self._target(thread_id)
+        return graph.invoke(self._graph_input(user_request, config, **inputs), config)
+
+
+    async def ainvoke(
+        self, user_request: str, thread_id: Optional[str] = None, **inputs: Any
+    ) -> AgentState:
+        """Async version of invoke, LLM waits of concurrent requests overlap."""
+        graph, config = self._target(thread_id)
+        graph_input = await self._agraph_input(user_request, config, **inputs)
+        return await graph.ainvoke(graph_input, config)
+
+
+    def _stream_event(self, mode: str, chunk: Any) -> Optional[StreamEvent]:
+        if mode == "messages":
+            message, metadata = chunk
+            node = metadata.get("langgraph_node")
+            # Whole messages written to the state are echoed too, keep the LLM chunks only
+            is_chunk = isinstance(message, AIMessageChunk)
+            if node in self.stream_nodes and is_chunk and message.content:
+                return StreamEvent(kind="token", node=node, content=message.content)
+            return None
+
+        if mode == "updates":
+            for node, update in chunk.items():
+                messages = (update or {}).get('messages') or []
+                content = messages[-1].content if messages else ""
+                return StreamEvent(kind="node", node=node, content=content)
+
+        return None
+
+
+    def stream(
+        self, user_request: str, thread_id: Optional[str] = None, **inputs: Any
+    ) -> Iterator[StreamEvent]:
+        """
+        Run the graph for the user request, yielding node progress as each node
+        finishes and the tokens of the final answer as they are generated.
+        The last event is always kind "final" and carries the final state.
+        """
+        state = None
+        graph, config = self._target(thread_id)
+        for mode, chunk in graph.stream(
+            self._graph_input(user_request, config, **inputs),
+            config,
+            stream_mode=self.stream_modes
+        ):
+            if mode == "values":
+                state = chunk
+                continue
+            event = self._stream_event(mode, chunk)
+            if event is not None:
+                yield event
+
+        yield StreamEvent(kind="final", content=state['messages'][-1].content, state=state)
+
+
+    async def astream(
+        self, user_request: str, thread_id: Optional[str] = None, **inputs: Any
+    ) -> AsyncIterator[StreamEvent]:
+        """Async version of stream."""
+        state = None
+        graph, config = self._target(thread_id)
+        async for mode, chunk in graph.astream(
+            await self._agraph_input(user_request, config, **inputs),
+            config,
+            stream_mode=self.stream_modes
+        ):
+            if mode == "values":
+                state = chunk
+                continue
+            event = self._stream_event(mode, chunk)
+            if event is not None:
+                yield event
+
+        yield StreamEvent(kind="final", content=state['messages'][-1].content, state=state)
+
+
+    def _compact_memory(self, state: AgentState) -> Dict[str, Any]:
+        """Entry node, folds the turns older than the memory window into a summary."""
+        update = self.memory.compact(state['messages'])
+        if update is None:
+            return {}
+        self.log(f"Conversation compacted to {len(update) - 1} messages")
+        return {"messages": update}
+
+
+    def _get_schema_index(self) -> SchemaIndex:
+        catalog = self.db.get_catalog()
+        stale = self._schema_index_version != self.db.schema_version
+        if self._schema_index is None or stale:
+            table_tokens = {
+                table: estimate_tokens(self.db.get_schema([table])) for table in catalog
+            }
+            self._schema_index = SchemaIndex(
+                catalog,
+                self.db.get_foreign_keys(),
+                table_tokens,
+                load_descriptions(path_tables)
+            )
+            self._schema_index_version = self.db.schema_version
+        return self._schema_index
+
+
+    def _relevant_schema(self, state: AgentState) -> str:
+        """
+        Schema restricted to the tables relevant to the current request.
+        Computed once in generate and reused by the review and correct prompts.
+        """
+        full_schema = self.db.get_schema()
+        schema = full_schema
+
+        if self.schema_pruning:
+            tables = self._get_schema_index().select(
+                state['user_input'], self.schema_top_k, self.schema_token_budget
+            )
+            if tables:
+                schema = self.db.get_schema(tables)
+
+        saved = estimate_tokens(full_schema) - estimate_tokens(schema)
+        state['schema'] = schema
+        state['schema_tokens_saved'] = saved
+        self.log(
+            f"Schema pruned to ~{estimate_tokens(schema)} tokens, saved ~{saved} tokens"
+        )
+        return schema
+
+
+    def _prompt_schema(self, state: AgentState) -> str:
+        return state.get('schema') or self.db.get_schema()
+
+
+    def _generate_inputs(self, state: AgentState) -> Dict[str, Any]:
         request = state['messages'][-1].content
         state['user_input'] = request
+        return {"schema": self._relevant_schema(state), "request": request}
+
 
-        query_text = self.chains.generate.invoke({
-            "schema": self.db.get_schema(),
-            "request": request
-        }).strip("```").strip("sql\n")
+    def _apply_generate(self, state: AgentState, response: str) -> AgentState:
+        query_text = clean_sql(response)
 
         state['query'] = SQLQuery(
             text=query_text,
@@ -40,59 +358,279 @@ class SQLBaseAgent:
         return state
 
 
-    def _review(self, state: AgentState) -> AgentState:
-        feedback = self.chains.review.invoke({
-            "query": state["query"].text,
-            "schema": self.db.get_schema()
-        })
+    def _generate(self, state: AgentState) -> AgentState:
+        inputs = self._generate_inputs(state)
+        if self.candidate_chains is not None:
+            return self._apply_generate(state, self._generate_candidates(inputs))
+        return self._apply_generate(state, self.chains.generate.invoke(inputs))
+
+
+    async def _agenerate(self, state: AgentState) -> AgentState:
+        inputs = await asyncio.to_thread(self._generate_inputs, state)
+        if self.candidate_chains is not None:
+            return self._apply_generate(state, await self._agenerate_candidates(inputs))
+        return self._apply_generate(state, await self.chains.generate.ainvoke(inputs))
+
+
+    def _sample_candidate(self, index: int, inputs: Dict[str, Any]) -> Tuple[int, str]:
+        # The first candidate is the regular generation, cached like any other
+        if index == 0:
+            return index, self.chains.generate.invoke(inputs)
+        return index, self.candidate_chains.generate.invoke(inputs, bypass_cache=True)
+
+
+    async def _asample_candidate(
+        self, index: int, inputs: Dict[str, Any]
+    ) -> Tuple[int, str]:
+        if index == 0:
+            return index, await self.chains.generate.ainvoke(inputs)
+        return index, await self.candidate_chains.generate.ainvoke(inputs, bypass_cache=True)
+
+
+    def _candidate_is_valid(self, response: str) -> bool:
+        return self.validator.validate(clean_sql(response)).verdict == Verdict.VALID
+
+
+    def _pick_candidate(
+        self, responses: Dict[int, str], valid: Dict[int, str], first: Optional[int]
+    ) -> str:
+        """
+        Response to keep: the first valid one, else the one most valid candidates agree
+        on (same normalized SQL), else the regular generation for the review loop.
+        """
+        if not responses:
+            raise RuntimeError("No candidate query could be generated")
 
+        if first is not None:
+            index, pick = first, "first"
+        elif valid:
+            normalized = {i: normalize_sql(clean_sql(valid[i])) for i in valid}
+            votes = Counter(normalized.values())
+            index = min(normalized, key=lambda i: (-votes[normalized[i]], i))
+            pick = "agreement"
+        else:
+            index, pick = (0 if 0 in responses else min(responses)), "none_valid"
+
+        CANDIDATE_PICKS.inc(agent=self.name, pick=pick)
+        self.log(f"{len(valid)}/{self.candidates} candidates valid, kept #{index} ({pick})")
+        return responses[index]
+
+
+    def _generate_candidates(self, inputs: Dict[str, Any]) -> str:
+        """
+        Sample the candidates concurrently and validate each as it arrives. In "first"
+        mode the remaining ones are not waited for once a valid query is found.
+        """
+        responses: Dict[int, str] = {}
+        valid: Dict[int, str] = {}
+        first = None
+        pool = ThreadPoolExecutor(max_workers=self.candidates)
+        try:
+            futures = [
+                pool.submit(self._sample_candidate, i, inputs)
+                for i in range(self.candidates)
+            ]
+            for future in as_completed(futures):
+                try:
+                    index, response = future.result()
+                except Exception as e:
+                    self.warn(f"Candidate generation failed: {e}")
+                    continue
+                responses[index] = response
+                if self._candidate_is_valid(response):
+                    valid[index] = response
+                    if self.candidate_selection == "first":
+                        first = index
+                        break
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        return self._pick_candidate(responses, valid, first)
+
+
+    async def _agenerate_candidates(self, inputs: Dict[str, Any]) -> str:
+        """Async version of _generate_candidates, the discarded generations are cancelled."""
+        responses: Dict[int, str] = {}
+        valid: Dict[int, str] = {}
+        first = None
+        tasks = [
+            asyncio.ensure_future(self._asample_candidate(i, inputs))
+            for i in range(self.candidates)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    index, response = await next_done
+                except Exception as e:
+                    self.warn(f"Candidate generation failed: {e}")
+                    continue
+                responses[index] = response
+                if await asyncio.to_thread(self._candidate_is_valid, response):
+                    valid[index] = response
+                    if self.candidate_selection == "first":
+                        first = index
+                        break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return self._pick_candidate(responses, valid, first)
+
+
+    def _review_inputs(self, state: AgentState) -> Dict[str, Any]:
+        return {"query": state["query"].text, "schema": self._prompt_schema(state)}
+
+
+    def _apply_review(self, state: AgentState, feedback: str) -> AgentState:
         state['query'].feedback = feedback
         state['messages'].append(AIMessage(content=f"Review Feedback: {feedback}"))
 
-        if "INCORRECT" in feedback.upper():
-            state['query'].status = QueryStatus.NEEDS_CORRECTION
-        if "INVALID" in feedback.upper():
+        # The review is asked to start with its verdict, fall back to a search otherwise
+        words = feedback.strip().split(None, 1)
+        verdict = words[0].strip("*:.,").upper() if words else ""
+        if verdict not in ("CORRECT", "INCORRECT", "INVALID"):
+            upper = feedback.upper()
+            verdict = next((v for v in ("INVALID", "INCORRECT") if v in upper), "CORRECT")
+
+        if verdict == "INVALID":
             state['query'].status = QueryStatus.FAILED
+        elif verdict == "INCORRECT":
+            state['query'].status = QueryStatus.NEEDS_CORRECTION
         else:
             state['query'].status = QueryStatus.READY
 
         return state
 
 
-    def _correct(self, state: AgentState) -> AgentState:
-        if state['query'].retry_count >= self.max_retries:
-            state['query'].status = QueryStatus.FAILED
-            return state
+    def _local_review(self, state: AgentState) -> Optional[str]:
+        """
+        Review feedback from the static validator, None when the query is ambiguous
+        and must go through the LLM review chain.
+        """
+        if not self.local_validation:
+            return None
+
+        validation = self.validator.validate(state['query'].text)
+        if validation.verdict == Verdict.AMBIGUOUS:
+            self.log(f"Local validation inconclusive: {validation.feedback}")
+            return None
+        return validation.feedback
+
+
+    def _review(self, state: AgentState) -> AgentState:
+        feedback = self._local_review(state)
+        if feedback is not None:
+            return self._apply_review(state, feedback)
+
+        inputs = self._review_inputs(state)
+        return self._apply_review(state, self.chains.review.invoke(inputs))
 
-        corrected_query = self.chains.correct.invoke({
+
+    async def _areview(self, state: AgentState) -> AgentState:
+        feedback = await asyncio.to_thread(self._local_review, state)
+        if feedback is not None:
+            return self._apply_review(state, feedback)
+
+        inputs = await asyncio.to_thread(self._review_inputs, state)
+        return self._apply_review(state, await self.chains.review.ainvoke(inputs))
+
+
+    def _correct_inputs(self, state: AgentState) -> Dict[str, Any]:
+        return {
             "query": state['query'].text,
             "feedback": state['query'].feedback,
-            "schema": self.db.get_schema()
-        })
+            "schema": self._prompt_schema(state)
+        }
 
+
+    def _apply_correct(self, state: AgentState, response: str) -> AgentState:
+        corrected_query = clean_sql(response)
         state['query'].text = corrected_query
         state['query'].status = QueryStatus.READY
         state['messages'].append(AIMessage(content=f"Corrected SQL Query: {corrected_query}"))
         return state
 
 
-    def _extract(self, state: AgentState) -> AgentState:
-        result = self.db.extract_query(state['query'].text)
-        state['result'] = result
+    def _correct(self, state: AgentState) -> AgentState:
+        if state['query'].retry_count >= self.max_retries:
+            state['query'].status = QueryStatus.FAILED
+            return state
+
+        inputs = self._correct_inputs(state)
+        return self._apply_correct(state, self.chains.correct.invoke(inputs))
+
+
+    async def _acorrect(self, state: AgentState) -> AgentState:
+        if state['query'].retry_count >= self.max_retries:
+            state['query'].status = QueryStatus.FAILED
+            return state
+
+        inputs = await asyncio.to_thread(self._correct_inputs, state)
+        return self._apply_correct(state, await self.chains.correct.ainvoke(inputs))
+
+
+    def _extract_in_memory(
+        self, query: str, filepath: str, export_format: str
+    ) -> QueryResult:
+        df = self.db.extract_query(query)
+        if not df.empty:
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            with get_format(export_format).writer(filepath, list(df.columns)) as writer:
+                writer.write(list(df.itertuples(index=False, name=None)))
+
+        return QueryResult(
+            success=not df.empty,
+            output=filepath,
+            row_count=len(df),
+            columns=list(df.columns)
+        )
+
+
+    def _budget_exceeded(self, state: AgentState, error: QueryBudgetExceeded) -> AgentState:
+        """Stop the graph, a correction loop would only retry the same expensive query."""
+        self.log(f"Query refused: {error.reason}")
+        state['result'] = QueryResult(success=False, error=error.reason, row_count=0)
+        state['query'].status = QueryStatus.BUDGET_EXCEEDED
+        state['messages'].append(AIMessage(
+            content=f"The query was stopped because it is too expensive ({error.reason}). "
+                    "Please narrow down your request, e.g. with filters or fewer tables."
+        ))
+        return state
 
+
+    def _extract(self, state: AgentState) -> AgentState:
         try:
-            os.remove(FILEPATH)
-        except:
-            pass
+            return self._extract_artifact(state)
+        except QueryBudgetExceeded as e:
+            return self._budget_exceeded(state, e)
+
+
+    def _extract_artifact(self, state: AgentState) -> AgentState:
+        query = state['query'].text
+        export_format = get_format(state.get('export_format') or EXPORT_FORMAT).name
+        key = self.results.key(query, self.db.version(), export_format)
+
+        artifact = self.results.lookup(key)
+        if artifact is not None:
+            # Same normalized query over the same database content, reuse the file
+            result = artifact.to_result()
+        else:
+            filepath = self.results.path_for(key, export_format)
+            if self.stream_extract:
+                result = self.db.extract_to_file(query, filepath, export_format)
+            else:
+                result = self._extract_in_memory(query, filepath, export_format)
+
+            if result.success and result.row_count:
+                result.artifact_key = self.results.put(key, result, export_format).key
+        state['result'] = result
 
-        if not state['result'].empty:
-            print("SUCCESS")
+        if result.success and result.row_count:
+            self.log(f"Extraction succeeded, {result.row_count} rows")
             state['query'].status = QueryStatus.COMPLETE
-            os.makedirs(os.path.dirname(FILEPATH), exist_ok=True)
-            result.to_csv(FILEPATH, index=False)
             state['messages'].append(AIMessage(content=f"Execution successful"))
         else:
-            print("FAIL")
+            self.warn(f"Extraction failed: {result.error or 'no rows returned'}")
             state['query'].retry_count += 1
             message = f"Error executing query: Check Langsmith"
             state['messages'].append(AIMessage(content=message))
@@ -104,15 +642,43 @@ class SQLBaseAgent:
         return state
 
 
+    def _fetch_rows(self, query: str) -> Any:
+        """Rows of the query, None when it failed."""
+        return self.db.execute_query(query)
+
+
+    def _result_data(self, state: AgentState) -> Any:
+        """Rows of the current result, fetched again if its handle was evicted."""
+        result = state.get('result')
+        if result is None or result.handle is None:
+            return result.data if result is not None else None
+
+        data = handles.get(result.handle)
+        if data is None:
+            self.log("Result handle evicted, fetching the rows again")
+            data = self._fetch_rows(self.db.guard.limit(state['query'].text, self.row_limit))
+        return data
+
+
     def _execute(self, state: AgentState) -> AgentState:
+        query = self.db.guard.limit(state['query'].text, self.row_limit)
         try:
-            result = self.db.execute_query(state['query'].text)
-            state['result'] = result
+            rows = self._fetch_rows(query)
+        except QueryBudgetExceeded as e:
+            return self._budget_exceeded(state, e)
 
-            print("SUCCESS")
+        if rows is not None:
+            # The state only holds a handle, the rows stay out of every state copy
+            state['result'] = QueryResult(
+                success=True, handle=handles.put(rows), row_count=len(rows)
+            )
+            if len(rows) == self.row_limit:
+                self.log(f"Result truncated to {self.row_limit} rows")
+
+            self.log("Query execution succeeded")
             state['query'].status = QueryStatus.COMPLETE
-        except:
-            print("FAIL")
+        else:
+            self.warn("Query execution failed")
             state['query'].retry_count += 1
             message = "Error executing query: Check Langsmith"
             state['messages'].append(AIMessage(content=message))
@@ -0,0 +1,210 @@
+"""
+Run a file of natural language requests through one shared ExtractorAgent
+with bounded concurrency.
+
+    python -m sql_assistant.batch requests.jsonl --out data/batch --concurrency 8
+
+Requests are read from JSONL ({"request": ..., "id": ..., "export_format": ...})
+or CSV (same column names, only "request" is required). Per request outputs go
+to <out>/results.jsonl as they complete and a latency/failure summary to
+<out>/summary.json.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from sql_assistant.config import EXPORT_FORMAT
+from sql_assistant.extractor.chat import ExtractorAgent
+from sql_assistant.query import QueryStatus
+
+
+@dataclass
+class BatchRequest:
+    id: str
+    request: str
+    export_format: str = EXPORT_FORMAT
+
+
+@dataclass
+class BatchResult:
+    id: str
+    request: str
+    success: bool
+    latency_s: float
+    attempts: int
+    sql_retries: int = 0
+    query: Optional[str] = None
+    status: Optional[str] = None
+    message: Optional[str] = None
+    row_count: Optional[int] = None
+    artifact: Optional[str] = None
+    schema_tokens_saved: Optional[int] = None
+    error: Optional[str] = None
+
+
+def load_requests(path: str) -> List[BatchRequest]:
+    with open(path, newline="") as file:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(file))
+        else:
+            rows = [json.loads(line) for line in file if line.strip()]
+
+    return [
+        BatchRequest(
+            id=str(row.get("id") or i),
+            request=row["request"],
+            export_format=row.get("export_format") or EXPORT_FORMAT
+        )
+        for i, row in enumerate(rows)
+    ]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linearly interpolated percentile, q in [0, 100]."""
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(results: List[BatchResult], wall_time: float) -> Dict[str, Any]:
+    latencies = [result.latency_s for result in results]
+    failures = [result for result in results if not result.success]
+
+    return {
+        "requests": len(results),
+        "succeeded": len(results) - len(failures),
+        "failed": len(failures),
+        "failed_ids": [result.id for result in failures],
+        "attempt_retries": sum(result.attempts - 1 for result in results),
+        "sql_retries": sum(result.sql_retries for result in results),
+        "schema_tokens_saved": sum(result.schema_tokens_saved or 0 for result in results),
+        "wall_time_s": wall_time,
+        "throughput_rps": len(results) / wall_time if wall_time else None,
+        "latency_s": {
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies, default=None),
+        },
+    }
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        agent: ExtractorAgent,
+        concurrency: int = 8,
+        retries: int = 1,
+        backoff_s: float = 1.0
+    ):
+        self.agent = agent
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff_s = backoff_s
+
+
+    async def _run_one(
+        self, item: BatchRequest, semaphore: asyncio.Semaphore
+    ) -> BatchResult:
+        async with semaphore:
+            start = time.perf_counter()
+            attempts = 0
+            # Retries resume the graph from the last node the failed attempt completed
+            thread_id = uuid.uuid4().hex
+            while True:
+                attempts += 1
+                try:
+                    state = await self.agent.aexecute(
+                        item.request, item.export_format, thread_id
+                    )
+                    break
+                except Exception as e:
+                    if attempts > self.retries:
+                        return BatchResult(
+                            id=item.id,
+                            request=item.request,
+                            success=False,
+                            latency_s=time.perf_counter() - start,
+                            attempts=attempts,
+                            error=f"{type(e).__name__}: {e}"
+                        )
+                    await asyncio.sleep(self.backoff_s * 2 ** (attempts - 1))
+
+        query = state.get('query')
+        result = state.get('result')
+        success = query is not None and query.status == QueryStatus.COMPLETE
+        return BatchResult(
+            id=item.id,
+            request=item.request,
+            success=success,
+            latency_s=time.perf_counter() - start,
+            attempts=attempts,
+            sql_retries=query.retry_count if query is not None else 0,
+            query=query.text if query is not None else None,
+            status=query.status.value if query is not None else None,
+            message=state['messages'][-1].content,
+            row_count=getattr(result, "row_count", None),
+            artifact=getattr(result, "output", None),
+            schema_tokens_saved=state.get('schema_tokens_saved'),
+            error=getattr(result, "error", None)
+        )
+
+
+    async def run(self, requests: List[BatchRequest], out_dir: str) -> Dict[str, Any]:
+        os.makedirs(out_dir, exist_ok=True)
+        # DB work of the graph nodes is offloaded to the default executor, size it to match
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=self.concurrency)
+        )
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        start = time.perf_counter()
+        results = []
+        with open(os.path.join(out_dir, "results.jsonl"), "w") as out:
+            tasks = [self._run_one(item, semaphore) for item in requests]
+            for task in asyncio.as_completed(tasks):
+                result = await task
+                results.append(result)
+                out.write(json.dumps(asdict(result)) + "\n")
+                out.flush()
+
+        summary = summarize(results, time.perf_counter() - start)
+        with open(os.path.join(out_dir, "summary.json"), "w") as out:
+            json.dump(summary, out, indent=2)
+
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a batch of requests through the extractor"
+    )
+    parser.add_argument("requests", help="JSONL or CSV file of requests")
+    parser.add_argument("--out", default="data/batch", help="Output directory")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--retries", type=int, default=1, help="Retries per failing request")
+    args = parser.parse_args()
+
+    runner = BatchRunner(
+        ExtractorAgent(), concurrency=args.concurrency, retries=args.retries
+    )
+    summary = asyncio.run(runner.run(load_requests(args.requests), args.out))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate in-memory size of a query result in bytes."""
+    if hasattr(value, "memory_usage"):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(
+            sys.getsizeof(row) + sum(sys.getsizeof(item) for item in row)
+            if isinstance(row, tuple) else sys.getsizeof(row)
+            for row in value
+        )
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    In-process LRU cache of query results bounded by their estimated byte size.
+    Every entry remembers the database version it was computed against and is
+    dropped as soon as it is read back under a different one.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[str, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+
+    def _drop(self, key: Hashable):
+        _, _, nbytes = self._entries.pop(key)
+        self.size -= nbytes
+
+
+    def get(self, key: Hashable, version: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry[0] != version:
+                self._drop(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+
+    def put(self, key: Hashable, version: str, value: Any):
+        nbytes = estimate_size(value)
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+            while self._entries and self.size + nbytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+            self._entries[key] = (version, value, nbytes)
+            self.size += nbytes
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
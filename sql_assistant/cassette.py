@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+from sql_assistant.config import CASSETTE_LATENCY_S, CASSETTE_MODE, CASSETTE_PATH
+
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode for a prompt that was never recorded."""
+
+
+class Cassette:
+    """
+    JSON file of recorded chat responses keyed by model id and prompt messages.
+    Entries are written back to disk as soon as they are recorded.
+    """
+
+    def __init__(self, path: str = CASSETTE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                self.entries = json.load(file)
+
+
+    @staticmethod
+    def key(model_id: str, messages: List[BaseMessage]) -> str:
+        payload = json.dumps(
+            {"model": model_id, "messages": [[m.type, m.content] for m in messages]},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        return entry["response"] if entry is not None else None
+
+
+    def put(self, key: str, messages: List[BaseMessage], response: str):
+        with self._lock:
+            self.entries[key] = {
+                # The prompt is kept for humans reviewing the cassette, only the key matches
+                "prompt": [[m.type, m.content] for m in messages],
+                "response": response,
+            }
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(self.entries, file, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model replaying responses from a Cassette.
+    mode "replay" raises CassetteMiss for unknown prompts, "record" asks the inner
+    model on a miss and records its answer. Every call sleeps latency_s before
+    answering so offline runs keep a realistic share of time spent waiting on the LLM.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model_id: str
+    cassette: Cassette
+    mode: str = CASSETTE_MODE
+    latency_s: float = CASSETTE_LATENCY_S
+    inner: Optional[BaseChatModel] = None
+
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_id": self.model_id, "mode": self.mode}
+
+
+    def _lookup(self, messages: List[BaseMessage]) -> str:
+        key = self.cassette.key(self.model_id, messages)
+        response = self.cassette.get(key)
+        if response is not None:
+            return response
+
+        if self.mode != "record" or self.inner is None:
+            raise CassetteMiss(
+                f"No recorded response for prompt {key[:12]} in {self.cassette.path}"
+            )
+
+        response = self.inner.invoke(messages).content
+        self.cassette.put(key, messages, response)
+        return response
+
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        time.sleep(self.latency_s)
+        message = AIMessage(content=self._lookup(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency_s)
+        response = await asyncio.to_thread(self._lookup, messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=response))])
+
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency_s)
+        # Word sized chunks, enough to exercise the token streaming of the agents
+        for token in re.findall(r"\S+\s*|\s+", self._lookup(messages)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -1,58 +1,82 @@
-from langchain_core.output_parsers import StrOutputParser
+from typing import Any, Dict, Optional
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import Runnable
 
-from sql_assistant.config import chat
-from sql_assistant.utils import load_llm_chat
+from sql_assistant.config import LLM_CACHE_ENABLED, chat
+from sql_assistant.llm_cache import CachedChain, LLMCache
+from sql_assistant.utils import LLM_PARAMS, load_llm_chat
 
 
 class Chains:
-    def __init__(self):
-        self.llm = load_llm_chat(chat)
+    """
+    Prompt chains of the agents. Prefer sql_assistant.registry.get_chains over
+    building this directly, it shares one instance per model and parameters.
+    """
+
+    def __init__(
+        self,
+        model: str = chat,
+        use_cache: bool = LLM_CACHE_ENABLED,
+        llm: Optional[Runnable] = None,
+        cache: Optional[LLMCache] = None,
+        params: Optional[Dict[str, Any]] = None
+    ):
+        self.model = model
+        self.params = {**LLM_PARAMS, **(params or {})}
+        self.llm = llm or load_llm_chat(model, **(params or {}))
+        self.cache = (cache or LLMCache()) if use_cache else None
         self._init_chains()
-    
+
+    def _chain(self, prompt: ChatPromptTemplate, name: str) -> CachedChain:
+        return CachedChain(prompt, self.llm, self.cache, self.model, self.params, name)
+
     def _init_chains(self):
+        # generate, review and correct lead with the same schema message, a backend
+        # reusing the KV cache of a shared prompt prefix only processes it once
+        schema_prefix = ("system", """Database Schema:
+            {schema}""")
+
         # Generation Chain
         generation_prompt = ChatPromptTemplate.from_messages([
+            schema_prefix,
             ("system", """You are a SQL expert. You know everything about SQL and its operations.
              Don't give explanations, return only the SQL query.
              DO NOT generate a query if the request is invalid, empty or you don't understand it.
              If that is the case you should return the text 'invalid request'"""),
-            ("user", """Database Schema:
-            {schema}
-
-            User Request: {request}
+            ("user", """User Request: {request}
 
-            If the request is valid generate a SQL query to fulfill this request.""")
+            If the request is valid generate a SQL query to fulfill this request """
+                     "using the schema above.")
         ])
-        self.generate = generation_prompt | self.llm | StrOutputParser()
+        self.generate = self._chain(generation_prompt, "generate")
 
         # Review Chain
         review_prompt = ChatPromptTemplate.from_messages([
+            schema_prefix,
             ("system", """You are a SQL expert.
              You will review the query for correctness according to the user request.
              DO NOT try to fix the request if a query isn't provided.
              If a query isn't provided mark it as INVALID.
              """),
-            ("user", """Review this SQL query:
+            ("user", """Review this SQL query against the schema above:
             {query}
 
-            Schema:
-            {schema}
-
             Start with CORRECT, INCORRECT or INVALID followed by a brief feedback.""")
         ])
-        self.review = review_prompt | self.llm | StrOutputParser()
+        self.review = self._chain(review_prompt, "review")
         
         # Correction Chain
         correction_prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are a SQL expert. The following query seems to be wrong. Make any corrections based on the feedback given. Return only the query to the user."),
+            schema_prefix,
+            ("system", "You are a SQL expert. The following query seems to be wrong. "
+                       "Make any corrections based on the feedback given "
+                       "and the schema above. Return only the query to the user."),
             ("user", """Query: {query}
             Feedback: {feedback}
-            Schema: {schema}
 
             Provide only the corrected query.""")
         ])
-        self.correct = correction_prompt | self.llm | StrOutputParser()
+        self.correct = self._chain(correction_prompt, "correct")
 
         file_output_prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a helpful assistant.
@@ -69,7 +93,7 @@ class Chains:
              a download button made available for downloading the data.""")
         ])
 
-        self.file_output_chain = file_output_prompt | self.llm | StrOutputParser()
+        self.file_output_chain = self._chain(file_output_prompt, "file_output_chain")
 
         # Analysis reflection chain
         analysis_prompt = ChatPromptTemplate.from_messages([
@@ -82,7 +106,7 @@ class Chains:
             TARGET_COLUMNS: [columns to analyze]
             RATIONALE: [brief explanation of your choice]""")
         ])
-        self.analysis_reflection = analysis_prompt | self.llm | StrOutputParser()
+        self.analysis_reflection = self._chain(analysis_prompt, "analysis_reflection")
 
         # Natural language output chain
         sql_output_prompt = ChatPromptTemplate.from_messages([
@@ -100,5 +124,16 @@ class Chains:
             Query result: {sql_result}
             Please explain this result in natural language.""")
         ])
-        self.sql_output_chain = sql_output_prompt | self.llm | StrOutputParser()
+        self.sql_output_chain = self._chain(sql_output_prompt, "sql_output_chain")
+
+        # Summary of older conversation turns, see sql_assistant.memory
+        summary_prompt = ChatPromptTemplate.from_messages([
+            ("system", """Summarize the conversation between a user and a SQL assistant.
+            Keep the user's questions, the tables, filters and SQL used to answer them and
+            the key figures of the answers. Use at most a few short lines per question.
+            Summary so far: {summary}"""),
+            MessagesPlaceholder(variable_name="messages"),
+            ("user", "Write the updated summary, nothing else.")
+        ])
+        self.summarize = self._chain(summary_prompt, "summarize")
         
\ No newline at end of file
@@ -0,0 +1,481 @@
+import asyncio
+import dataclasses
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from sql_assistant.config import (
+    CHECKPOINT_KEEP_LAST,
+    CHECKPOINT_PATH,
+    CHECKPOINT_PRUNE_EVERY,
+    CHECKPOINT_TTL_SECONDS,
+)
+from sql_assistant.query import QueryResult
+from sql_assistant.state import AnalysisResult
+
+# Our state types, allowed to be rebuilt from a checkpoint
+STATE_TYPES = [
+    ("sql_assistant.query", "QueryStatus"),
+    ("sql_assistant.query", "SQLQuery"),
+    ("sql_assistant.query", "QueryResult"),
+    ("sql_assistant.state", "AnalysisType"),
+    ("sql_assistant.state", "AnalysisResult"),
+]
+CHECKPOINT_COLUMNS = "checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata"
+# Serialized values above this size are zlib compressed
+COMPRESS_MIN_BYTES = 1024
+
+
+def compact(value: Any) -> Any:
+    """
+    Checkpointable copy of a state value. DataFrames are dropped, results keep
+    their handle instead, and plotly figures are stored as their JSON text:
+    their dict form holds numpy arrays (datetime64 ones included) msgpack rejects.
+    """
+    if isinstance(value, QueryResult) and value.data is not None:
+        return dataclasses.replace(value, data=None)
+    if isinstance(value, AnalysisResult) and hasattr(value.figure, "to_plotly_json"):
+        import plotly.io as pio
+
+        return dataclasses.replace(value, figure=pio.to_json(value.figure, validate=False))
+    if type(value).__name__ == "DataFrame":
+        return None
+    if isinstance(value, dict):
+        return {key: compact(item) for key, item in value.items()}
+    if isinstance(value, tuple) and hasattr(value, "_fields"):
+        # Namedtuples take their fields as arguments, not as one iterable
+        return type(value)(*(compact(item) for item in value))
+    if isinstance(value, (list, tuple)):
+        return type(value)(compact(item) for item in value)
+    return value
+
+
+class CompactSerializer(JsonPlusSerializer):
+    """msgpack of the compacted value, zlib compressed when it is large."""
+
+    def __init__(self):
+        super().__init__(allowed_msgpack_modules=STATE_TYPES)
+
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = super().dumps_typed(compact(obj))
+        if len(data) >= COMPRESS_MIN_BYTES:
+            return f"{type_}+zlib", zlib.compress(data)
+        return type_, data
+
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.endswith("+zlib"):
+            type_, payload = type_[:-len("+zlib")], zlib.decompress(payload)
+        return super().loads_typed((type_, payload))
+
+
+class SqliteCheckpointer(BaseCheckpointSaver[str]):
+    """
+    LangGraph checkpointer backed by sqlite, one history per thread id.
+    Channel values are stored once per version, a checkpoint only references them,
+    so a step that changes one channel writes one blob. Every prune_every
+    checkpoints, threads idle for longer than ttl_seconds are deleted and the
+    current thread is trimmed to its keep_last most recent checkpoints.
+    sqlite commits, compression and the lock all block, so the async methods run
+    their sync counterparts in a worker thread.
+    """
+
+    def __init__(
+        self,
+        path: str = CHECKPOINT_PATH,
+        keep_last: int = CHECKPOINT_KEEP_LAST,
+        ttl_seconds: int = CHECKPOINT_TTL_SECONDS,
+        prune_every: int = CHECKPOINT_PRUNE_EVERY
+    ):
+        super().__init__(serde=CompactSerializer())
+        self.path = path
+        self.keep_last = keep_last
+        self.ttl_seconds = ttl_seconds
+        self.prune_every = prune_every
+        self._puts = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                parent_id TEXT,
+                type TEXT NOT NULL,
+                checkpoint BLOB NOT NULL,
+                metadata_type TEXT NOT NULL,
+                metadata BLOB NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                version TEXT NOT NULL,
+                type TEXT NOT NULL,
+                value BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT NOT NULL,
+                value BLOB,
+                task_path TEXT NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            CREATE INDEX IF NOT EXISTS checkpoints_created ON checkpoints (created);"""
+        )
+        self._conn.commit()
+
+
+    def _load_blobs(
+        self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions
+    ) -> Dict[str, Any]:
+        values = {}
+        for channel, version in versions.items():
+            row = self._conn.execute(
+                "SELECT type, value FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+                "AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version))
+            ).fetchone()
+            if row is not None and row[0] != "empty":
+                values[channel] = self.serde.loads_typed(row)
+        return values
+
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, checkpoint_blob, metadata_type, metadata_blob = row
+        checkpoint = self.serde.loads_typed((type_, checkpoint_blob))
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? "
+            "AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+
+        def config(checkpoint_id: str) -> RunnableConfig:
+            return {"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id
+            }}
+
+        return CheckpointTuple(
+            config=config(checkpoint_id),
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(
+                    thread_id, checkpoint_ns, checkpoint["channel_versions"]
+                ),
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            parent_config=config(parent_id) if parent_id else None,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((type_, value)))
+                for task_id, channel, type_, value in writes
+            ],
+        )
+
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        sql = (f"SELECT {CHECKPOINT_COLUMNS} FROM checkpoints "
+               "WHERE thread_id = ? AND checkpoint_ns = ?")
+        params: List[Any] = [thread_id, checkpoint_ns]
+        if checkpoint_id:
+            sql += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        sql += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+            return self._tuple(thread_id, checkpoint_ns, row) if row is not None else None
+
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        sql = f"SELECT thread_id, checkpoint_ns, {CHECKPOINT_COLUMNS} FROM checkpoints"
+        clauses, params = [], []
+        if config is not None:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(get_checkpoint_id(config))
+        if before is not None and get_checkpoint_id(before):
+            clauses.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            tuples = []
+            for thread_id, checkpoint_ns, *row in rows:
+                if limit is not None and len(tuples) >= limit:
+                    break
+                metadata = self.serde.loads_typed((row[-2], row[-1]))
+                if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                tuples.append(self._tuple(thread_id, checkpoint_ns, tuple(row)))
+        yield from tuples
+
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        values = checkpoint["channel_values"]
+        stored = {key: value for key, value in checkpoint.items() if key != "channel_values"}
+
+        type_, checkpoint_blob = self.serde.dumps_typed(stored)
+        metadata_type, metadata_blob = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata)
+        )
+        blobs = [
+            (thread_id, checkpoint_ns, channel, str(version),
+             *(self.serde.dumps_typed(values[channel]) if channel in values
+               else ("empty", None)))
+            for channel, version in new_versions.items()
+        ]
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"],
+                 config["configurable"].get("checkpoint_id"),
+                 type_, checkpoint_blob, metadata_type, metadata_blob, time.time())
+            )
+            self._conn.commit()
+            self._puts += 1
+            prune = self.prune_every and self._puts % self.prune_every == 0
+
+        if prune:
+            self.prune_expired()
+            self.trim(thread_id)
+
+        return {"configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"]
+        }}
+
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id,
+             WRITES_IDX_MAP.get(channel, idx), channel, *self.serde.dumps_typed(value),
+             task_path)
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        # Special writes (errors, interrupts) replace, regular ones are only written once
+        with self._lock:
+            for verb, negative in (("IGNORE", False), ("REPLACE", True)):
+                self._conn.executemany(
+                    f"INSERT OR {verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [row for row in rows if (row[4] < 0) == negative]
+                )
+            self._conn.commit()
+
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for table in ("checkpoints", "blobs", "writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+
+    def trim(self, thread_id: str, keep_last: Optional[int] = None) -> int:
+        """Keep only the keep_last latest checkpoints of the thread, return how many went."""
+        keep_last = self.keep_last if keep_last is None else keep_last
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT checkpoint_ns, checkpoint_id FROM checkpoints WHERE thread_id = ? "
+                "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                (thread_id, keep_last)
+            ).fetchall()
+            if not old:
+                return 0
+
+            for checkpoint_ns, checkpoint_id in old:
+                for table in ("checkpoints", "writes"):
+                    self._conn.execute(
+                        f"DELETE FROM {table} "
+                        "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                        (thread_id, checkpoint_ns, checkpoint_id)
+                    )
+            # The oldest kept checkpoint has no parent any more
+            self._conn.execute(
+                "UPDATE checkpoints SET parent_id = NULL "
+                "WHERE thread_id = ? AND parent_id NOT IN "
+                "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ?)",
+                (thread_id, thread_id)
+            )
+            self._delete_unreferenced_blobs(thread_id)
+            self._conn.commit()
+            return len(old)
+
+
+    def _delete_unreferenced_blobs(self, thread_id: str):
+        referenced = set()
+        for checkpoint_ns, type_, blob in self._conn.execute(
+            "SELECT checkpoint_ns, type, checkpoint FROM checkpoints WHERE thread_id = ?",
+            (thread_id,)
+        ):
+            versions = self.serde.loads_typed((type_, blob))["channel_versions"]
+            referenced.update(
+                (checkpoint_ns, channel, str(v)) for channel, v in versions.items()
+            )
+
+        stored = self._conn.execute(
+            "SELECT checkpoint_ns, channel, version FROM blobs WHERE thread_id = ?",
+            (thread_id,)
+        ).fetchall()
+        self._conn.executemany(
+            "DELETE FROM blobs "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            [(thread_id, *key) for key in stored if tuple(key) not in referenced]
+        )
+
+
+    def prune_expired(self, ttl_seconds: Optional[int] = None) -> int:
+        """Delete every thread without a checkpoint in the last ttl_seconds."""
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            threads = [row[0] for row in self._conn.execute(
+                "SELECT thread_id FROM checkpoints "
+                "GROUP BY thread_id HAVING MAX(created) < ?",
+                (time.time() - ttl_seconds,)
+            )]
+        for thread_id in threads:
+            self.delete_thread(thread_id)
+        return len(threads)
+
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("checkpoints", "blobs", "writes")
+            }
+            counts["threads"] = self._conn.execute(
+                "SELECT COUNT(DISTINCT thread_id) FROM checkpoints"
+            ).fetchone()[0]
+        counts["bytes"] = os.path.getsize(self.path)
+        return counts
+
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # Zero padded so versions compare as strings, as InMemorySaver does
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
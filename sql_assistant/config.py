@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -18,4 +19,107 @@ def get_root_dir():
     return str(cur_dir)
 
 path_db = get_root_dir() + '/data/db/chinook.db'
-FILEPATH = get_root_dir() + "/data/query-results/query_results.csv"
+path_tables = get_root_dir() + '/data/db/tables.txt'
+RESULTS_DIR = get_root_dir() + "/data/query-results"
+
+# Read-only connection pool tuning
+DB_MMAP_SIZE = 256 * 1024 * 1024
+DB_CACHE_SIZE = -64 * 1024  # negative values are KiB
+
+# Streaming extraction of query results
+STREAM_EXTRACT = True
+EXTRACT_CHUNK_ROWS = 10_000
+EXTRACT_MEMORY_LIMIT_MB = 64
+
+# Default export format of the extractor, see sql_assistant.export.EXPORT_FORMATS
+EXPORT_FORMAT = "csv"
+DOWNLOAD_ENDPOINT = "/download"
+
+# Per-request result artifacts, evicted by age and total size
+RESULT_STORE_MAX_MB = 1024
+RESULT_STORE_TTL_SECONDS = 24 * 60 * 60
+
+# In-process cache of execute_query/extract_query results
+QUERY_CACHE_MAX_MB = 256
+
+# On-disk LLM response cache wrapped around every chain
+LLM_CACHE_ENABLED = os.getenv("SQL_ASSISTANT_LLM_CACHE", "1") == "1"
+LLM_CACHE_PATH = get_root_dir() + "/data/cache/llm_cache.db"
+LLM_CACHE_MAX_ENTRIES = 10_000
+LLM_CACHE_FLUSH_HITS = 100  # hits whose access times are buffered before one write
+
+# Relevance based schema pruning of the generate/review/correct prompts
+SCHEMA_PRUNING = True
+SCHEMA_TOP_K = 4
+SCHEMA_TOKEN_BUDGET = 1500
+
+# Static validation (parse + EXPLAIN) ahead of the LLM review chain
+LOCAL_VALIDATION = True
+
+# Multi-candidate generation: SQL_CANDIDATES queries sampled concurrently and
+# validated locally, the first valid one ("first") or the one most valid
+# candidates agree on ("agreement") is kept. 1 generates a single query
+SQL_CANDIDATES = int(os.getenv("SQL_ASSISTANT_SQL_CANDIDATES", "1"))
+CANDIDATE_TEMPERATURE = 0.7  # of every candidate but the first, regular one
+CANDIDATE_SELECTION = "first"
+
+# Query cost guard: plan inspection, execution budget and automatic LIMITs
+QUERY_TIME_BUDGET_S = 30.0
+QUERY_STEP_BUDGET = 5_000_000_000  # sqlite VM instructions
+QUERY_MAX_SCAN_ROWS = 100_000_000  # estimated rows of a cartesian join of full scans
+QA_ROW_LIMIT = 1000
+ANALYST_ROW_LIMIT = 100_000
+# Analyst aggregates (bins, quartiles, correlations, groups) computed in SQL over the query
+ANALYST_PUSHDOWN = True
+
+# Conversation memory, see sql_assistant.memory
+MEMORY_WINDOW = 12  # most recent messages kept verbatim in the state
+MEMORY_TOKEN_BUDGET = 2000  # of the history sent to the answer prompt
+MEMORY_SUMMARY = "extractive"  # "llm", "extractive" or "" to drop older messages
+MEMORY_SUMMARY_TOKENS = 500
+
+# Query results live outside of the state behind handles, see sql_assistant.handles
+RESULT_HANDLES_MAX_MB = 256
+RESULT_PROMPT_TOKENS = 1000  # of result rows shown to the answer prompt
+
+# Data reduction ahead of the analyst charts, see sql_assistant.analyst.reduction
+PLOT_MAX_POINTS = 5000  # per chart, larger series are decimated or pre-binned
+PLOT_DECIMATION = "lttb"  # or "minmax" for temporal series
+PLOT_HIST_BINS = 50
+PLOT_SCATTER_SAMPLE = 2000  # rows of a scatter matrix
+PLOT_MAX_CATEGORIES = 50  # bars of an aggregation chart
+PLOT_WEBGL_THRESHOLD = 1000  # points above which line/scatter traces use WebGL
+
+# Analyst HTML reports. PLOTLY_JS is "inline" to embed plotly.js in every report,
+# otherwise the URL of a plotly.min.js, by default the copy served by the API
+PLOTLY_JS_ENDPOINT = "/static/plotly.min.js"
+PLOTLY_JS = os.getenv("SQL_ASSISTANT_PLOTLY_JS", PLOTLY_JS_ENDPOINT)
+REPORT_CACHE_MAX_MB = 64
+
+# Durable graph state per session, see sql_assistant.checkpoint. Only runs given a
+# thread id are checkpointed, one-off requests are not
+CHECKPOINTS_ENABLED = os.getenv("SQL_ASSISTANT_CHECKPOINTS", "1") == "1"
+CHECKPOINT_PATH = os.getenv(
+    "SQL_ASSISTANT_CHECKPOINT_PATH", get_root_dir() + "/data/cache/checkpoints.db"
+)
+CHECKPOINT_KEEP_LAST = 20  # checkpoints kept per thread
+CHECKPOINT_TTL_SECONDS = 7 * 24 * 60 * 60  # threads idle for longer are deleted
+CHECKPOINT_PRUNE_EVERY = 50  # checkpoints written between two prunes
+
+# Chat backend: "huggingface" endpoint, "local" model or a "cassette" of recorded responses
+LLM_BACKEND = os.getenv("SQL_ASSISTANT_LLM_BACKEND", "huggingface")
+CASSETTE_PATH = os.getenv(
+    "SQL_ASSISTANT_CASSETTE_PATH", get_root_dir() + "/data/cassettes/chinook.json"
+)
+CASSETTE_MODE = os.getenv("SQL_ASSISTANT_CASSETTE_MODE", "replay")  # or "record"
+CASSETTE_LATENCY_S = float(os.getenv("SQL_ASSISTANT_CASSETTE_LATENCY_S", "0"))
+
+# In-process CPU backend (LLM_BACKEND "local") running the chat model through
+# transformers, see sql_assistant.local_llm
+# "int8" dynamic quantization of the linear layers, or "" for float32 weights
+LOCAL_QUANTIZE = os.getenv("SQL_ASSISTANT_LOCAL_QUANTIZE", "int8")
+LOCAL_THREADS = int(os.getenv("SQL_ASSISTANT_LOCAL_THREADS", "0"))  # 0 keeps torch's default
+LOCAL_PREFIX_CACHE = 8  # KV caches of leading schema messages kept
+LOCAL_MIN_PREFIX_TOKENS = 32  # shorter prefixes are not worth caching
+LOCAL_MAX_BATCH = 4  # requests generated together
+LOCAL_BATCH_WAIT_MS = 10  # for more requests to join a batch
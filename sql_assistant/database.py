@@ -1,48 +1,308 @@
+import os
 import sqlite3
-import pandas as pd
+import sys
+import threading
+import time
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from sql_assistant.query import QueryResult
+from sql_assistant.cache import ResultCache
+from sql_assistant.config import (
+    EXTRACT_CHUNK_ROWS,
+    EXTRACT_MEMORY_LIMIT_MB,
+    QUERY_CACHE_MAX_MB,
+)
+from sql_assistant.export import get_format
+from sql_assistant.guard import QueryBudgetExceeded, QueryGuard
+from sql_assistant.metrics import DB_ROWS, DB_SECONDS
+from sql_assistant.pool import ConnectionPool
+from sql_assistant.query import QueryResult, normalize_sql
 
 
 class DatabaseConnection:
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, guard: Optional[QueryGuard] = None):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path)
+        self.guard = guard or QueryGuard()
 
-    def get_schema(self) -> str:
-        with sqlite3.connect(self.db_path) as conn:
+        # Schema catalog cache, invalidated by the sqlite schema cookie
+        self._schema_lock = threading.Lock()
+        self._schema_version: Optional[int] = None
+        self._catalog: Dict[str, List[Tuple[str, str]]] = {}
+        self._foreign_keys: Dict[str, List[str]] = {}
+        self._schema_text: Optional[str] = None
+        self.schema_hits = 0
+        self.schema_misses = 0
+
+        # Query result cache, invalidated by data_version changes and file modifications
+        self.cache = ResultCache(QUERY_CACHE_MAX_MB * 1024 * 1024)
+        self._seen_data_version = threading.local()
+        self._generation = 0
+
+
+    def _load_catalog(self, cursor: sqlite3.Cursor) -> Dict[str, List[Tuple[str, str]]]:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+        tables = cursor.fetchall()
+
+        catalog = {}
+        for table in tables:
+            table_name = table[0]
+            cursor.execute(f"PRAGMA table_info({table_name})")
+            catalog[table_name] = [(col[1], col[2]) for col in cursor.fetchall()]
+
+        return catalog
+
+
+    def _load_foreign_keys(
+        self, cursor: sqlite3.Cursor, tables: Iterable[str]
+    ) -> Dict[str, List[str]]:
+        foreign_keys = {}
+        for table_name in tables:
+            cursor.execute(f"PRAGMA foreign_key_list({table_name})")
+            foreign_keys[table_name] = sorted({fk[2] for fk in cursor.fetchall()})
+
+        return foreign_keys
+
+
+    @staticmethod
+    def _render_schema(catalog: Dict[str, List[Tuple[str, str]]]) -> str:
+        schema_parts = []
+        for table_name, columns in catalog.items():
+            schema_parts.append(f"Table: {table_name}")
+            schema_parts.extend(f"- {name} ({col_type})" for name, col_type in columns)
+            schema_parts.append("")
+
+        return "\n".join(schema_parts)
+
+
+    def _refresh_schema(self) -> None:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = cursor.fetchall()
+            # The schema cookie is bumped by sqlite on every DDL statement
+            version = cursor.execute("PRAGMA schema_version").fetchone()[0]
+
+            with self._schema_lock:
+                if self._schema_text is not None and version == self._schema_version:
+                    self.schema_hits += 1
+                    return
+
+                self.schema_misses += 1
+                self._catalog = self._load_catalog(cursor)
+                self._foreign_keys = self._load_foreign_keys(cursor, self._catalog)
+                self._schema_text = self._render_schema(self._catalog)
+                self._schema_version = version
+
+
+    def get_catalog(self) -> Dict[str, List[Tuple[str, str]]]:
+        """Return the table -> [(column, type)] catalog, reloaded only on schema changes."""
+        self._refresh_schema()
+        return self._catalog
+
+
+    def get_foreign_keys(self) -> Dict[str, List[str]]:
+        """Return the table -> [referenced tables] map, cached like the catalog."""
+        self._refresh_schema()
+        return self._foreign_keys
+
+
+    @property
+    def schema_version(self) -> Optional[int]:
+        return self._schema_version
+
+
+    def get_schema(self, tables: Optional[Iterable[str]] = None) -> str:
+        """Render the schema, restricted to the given tables when provided."""
+        self._refresh_schema()
+        if tables is None:
+            return self._schema_text
+
+        selected = set(tables)
+        return self._render_schema(
+            {name: columns for name, columns in self._catalog.items() if name in selected}
+        )
+
+
+    def schema_cache_stats(self) -> Dict[str, Optional[int]]:
+        return {
+            "hits": self.schema_hits,
+            "misses": self.schema_misses,
+            "schema_version": self._schema_version,
+            "tables": len(self._catalog),
+        }
+
 
-            schema_parts = []
-            for table in tables:
-                table_name = table[0]
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = cursor.fetchall()
+    def version(self) -> str:
+        """
+        Token identifying the current content of the database.
+        Changes whenever the main file or its write-ahead log is modified.
+        """
+        parts = []
+        for suffix in ("", "-wal"):
+            try:
+                stat = os.stat(f"{self.db_path}{suffix}")
+                parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+            except FileNotFoundError:
+                parts.append("-")
 
-                schema_parts.append(f"Table: {table_name}")
-                schema_parts.extend(f"- {col[1]} ({col[2]})" for col in columns)
-                schema_parts.append("")
+        with self.pool.connection() as conn:
+            parts.append(str(conn.execute("PRAGMA schema_version").fetchone()[0]))
 
-            return "\n".join(schema_parts)
+        return "/".join(parts)
+
+
+    def _cache_version(self) -> str:
+        """
+        version() plus a generation counter bumped whenever the data_version seen
+        by this thread's connection moves, i.e. another connection committed.
+        """
+        with self.pool.connection() as conn:
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+
+        seen = getattr(self._seen_data_version, "value", None)
+        if seen is not None and seen != data_version:
+            self._generation += 1
+        self._seen_data_version.value = data_version
+
+        return f"{self.version()}#{self._generation}"
+
+
+    def explain(self, query: str) -> List[tuple]:
+        """
+        EXPLAIN QUERY PLAN rows of the query.
+        Preparing the statement resolves every table and column, errors raise sqlite3.Error.
+        """
+        with self.pool.connection() as conn:
+            return conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+
+
+    def pool_stats(self) -> Dict[str, int]:
+        return self.pool.stats()
+
+
+    def cache_stats(self) -> Dict[str, int]:
+        return self.cache.stats()
 
 
     def execute_query(self, query: str) -> QueryResult:
+        key = ("execute", normalize_sql(query))
+        version = self._cache_version()
+        cached = self.cache.get(key, version)
+        if cached is not None:
+            return list(cached)
+
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                result = cursor.execute(query)
-                return result
+            with self.pool.connection() as conn:
+                self.guard.check(conn, query)
+                with self.guard.budget(conn), DB_SECONDS.time(operation="execute"):
+                    cursor = conn.cursor()
+                    # Fetched eagerly, a live cursor must not outlive the pooled connection
+                    result = cursor.execute(query).fetchall()
+                DB_ROWS.observe(len(result), operation="execute")
+                self.cache.put(key, version, result)
+                return list(result)
+        except QueryBudgetExceeded:
+            raise
         except Exception as e:
             print(f"Query execution failed: {e}")
 
 
     def extract_query(self, query: str) -> QueryResult:
+        # pandas is only needed for in-memory extraction, keep it off the import path
+        import pandas as pd
+
+        key = ("extract", normalize_sql(query))
+        version = self._cache_version()
+        cached = self.cache.get(key, version)
+        if cached is not None:
+            return cached.copy(deep=False)
+
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                df = pd.read_sql_query(query, conn)
-                return df
+            with self.pool.connection() as conn:
+                self.guard.check(conn, query)
+                with self.guard.budget(conn), DB_SECONDS.time(operation="extract"):
+                    df = pd.read_sql_query(query, conn)
+                DB_ROWS.observe(len(df), operation="extract")
+                self.cache.put(key, version, df)
+                return df.copy(deep=False)
+        except QueryBudgetExceeded:
+            raise
         except Exception as e:
             print(f"{e}")
             return pd.DataFrame()
+
+
+    @staticmethod
+    def _rows_per_chunk(rows: List[tuple], chunk_rows: int, memory_limit: int) -> int:
+        """Size the next fetch so that one chunk stays under the memory ceiling."""
+        sample = rows[:100]
+        row_bytes = sum(
+            sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+            for row in sample
+        ) / len(sample)
+        return max(1, min(chunk_rows, int(memory_limit // row_bytes)))
+
+
+    def extract_to_file(
+        self,
+        query: str,
+        filepath: str,
+        export_format: str = "csv",
+        chunk_rows: int = EXTRACT_CHUNK_ROWS,
+        memory_limit_mb: int = EXTRACT_MEMORY_LIMIT_MB
+    ) -> QueryResult:
+        """
+        Stream the query result into a file of the given export format chunk by chunk.
+        Only row count and column names are kept in memory, the file is
+        written to a temporary path and moved in place once complete.
+        """
+        fmt = get_format(export_format)
+        memory_limit = memory_limit_mb * 1024 * 1024
+        # Unique per writer so concurrent extractions of the same artifact never collide
+        tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.part"
+        row_count = 0
+        start = time.perf_counter()
+
+        try:
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            with self.pool.connection() as conn:
+                self.guard.check(conn, query)
+                with self.guard.budget(conn) as budget:
+                    cursor = conn.execute(query)
+                    columns = [col[0] for col in cursor.description or []]
+
+                    with fmt.writer(tmp_path, columns) as writer:
+                        fetch_size = min(chunk_rows, 1000)
+                        while True:
+                            rows = cursor.fetchmany(fetch_size)
+                            if not rows:
+                                break
+                            # Only the cursor counts against the budget, not the file I/O
+                            with budget.paused():
+                                writer.write(rows)
+                            row_count += len(rows)
+                            fetch_size = self._rows_per_chunk(rows, chunk_rows, memory_limit)
+
+        except QueryBudgetExceeded:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        except Exception as e:
+            print(f"{e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return QueryResult(success=False, error=str(e), row_count=0)
+
+        DB_SECONDS.observe(time.perf_counter() - start, operation="extract_to_file")
+        DB_ROWS.observe(row_count, operation="extract_to_file")
+
+        if row_count:
+            os.replace(tmp_path, filepath)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        return QueryResult(
+            success=True,
+            output=filepath if row_count else None,
+            row_count=row_count,
+            columns=columns
+        )
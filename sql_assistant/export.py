@@ -0,0 +1,225 @@
+import csv
+import gzip
+import io
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class ResultWriter:
+    """
+    Streaming writer for query results.
+    Receives the column names once and then the rows chunk by chunk.
+    """
+
+    def __init__(self, path: str, columns: List[str]):
+        self.path = path
+        self.columns = columns
+
+    def write(self, rows: List[tuple]):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CSVWriter(ResultWriter):
+    def __init__(self, path: str, columns: List[str], compression: Optional[str] = None):
+        super().__init__(path, columns)
+        self._raw = None
+
+        if compression is None:
+            self._file = open(path, "w", newline="")
+        elif compression == "gzip":
+            self._file = gzip.open(path, "wt", newline="", compresslevel=6)
+        elif compression == "zstd":
+            try:
+                import zstandard
+            except ImportError as e:
+                raise ImportError("zstd export requires the 'zstandard' package") from e
+            self._raw = open(path, "wb")
+            stream = zstandard.ZstdCompressor(level=3).stream_writer(self._raw)
+            self._file = io.TextIOWrapper(stream, newline="")
+        else:
+            raise ValueError(f"Unknown CSV compression: {compression}")
+
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, rows: List[tuple]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+        if self._raw is not None and not self._raw.closed:
+            self._raw.close()
+
+
+class ArrowWriter(ResultWriter):
+    """
+    Base for the columnar writers.
+    The arrow schema is inferred from the first chunk and widened when a later chunk
+    does not fit it, e.g. int64 to float64 once a float shows up in an integer column.
+    What was already written is then rewritten under the wider schema. Values are only
+    ever cast exactly, a column mixing incompatible types fails the extract.
+    """
+
+    def __init__(self, path: str, columns: List[str]):
+        super().__init__(path, columns)
+        try:
+            import pyarrow
+        except ImportError as e:
+            raise ImportError("Columnar export requires the 'pyarrow' package") from e
+
+        self._pa = pyarrow
+        self._schema = None
+        self._writer = None
+
+    def _open(self, schema):
+        raise NotImplementedError
+
+    def _read(self, path: str) -> Iterator:
+        """Record batches of a file written by this writer."""
+        raise NotImplementedError
+
+    def _array(self, name: str, values: tuple):
+        pa = self._pa
+        try:
+            return pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            raise ValueError(f"Column '{name}' mixes value types, use a CSV format")
+
+    def _common_type(self, name: str, current, new):
+        pa = self._pa
+        if current == new or pa.types.is_null(new):
+            return current
+        if pa.types.is_null(current):
+            return new
+        if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in (current, new)):
+            return pa.float64()
+        raise ValueError(
+            f"Column '{name}' changed type mid-extract from {current} to {new}, "
+            "use a CSV format"
+        )
+
+    def _cast(self, array, field):
+        pa = self._pa
+        try:
+            return array.cast(field.type, safe=True)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise ValueError(
+                f"Column '{field.name}' cannot be stored exactly as {field.type}: {e}"
+            )
+
+    def _widen(self, schema):
+        """Rewrite the batches written so far under the wider schema and continue with it."""
+        self._writer.close()
+        written = f"{self.path}.narrow"
+        os.replace(self.path, written)
+        try:
+            self._schema = schema
+            self._writer = self._open(schema)
+            for batch in self._read(written):
+                arrays = [
+                    self._cast(array, field) for array, field in zip(batch.columns, schema)
+                ]
+                self._writer.write_batch(
+                    self._pa.RecordBatch.from_arrays(arrays, schema=schema)
+                )
+        finally:
+            os.remove(written)
+
+    def _to_batch(self, rows: List[tuple]):
+        pa = self._pa
+        arrays = [self._array(name, col) for name, col in zip(self.columns, zip(*rows))]
+
+        if self._schema is None:
+            self._schema = pa.schema(
+                [pa.field(name, array.type) for name, array in zip(self.columns, arrays)]
+            )
+            self._writer = self._open(self._schema)
+        else:
+            schema = pa.schema([
+                pa.field(field.name, self._common_type(field.name, field.type, array.type))
+                for field, array in zip(self._schema, arrays)
+            ])
+            if not schema.equals(self._schema):
+                self._widen(schema)
+
+        arrays = [self._cast(array, field) for array, field in zip(arrays, self._schema)]
+        return pa.RecordBatch.from_arrays(arrays, schema=self._schema)
+
+    def write(self, rows: List[tuple]):
+        if rows:
+            batch = self._to_batch(rows)
+            self._writer.write_batch(batch)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class ParquetWriter(ArrowWriter):
+    def _open(self, schema):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(self.path, schema, compression="zstd")
+
+    def _read(self, path: str) -> Iterator:
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).iter_batches()
+
+
+class ArrowIPCWriter(ArrowWriter):
+    def _open(self, schema):
+        options = self._pa.ipc.IpcWriteOptions(compression="zstd")
+        return self._pa.ipc.new_file(self.path, schema, options=options)
+
+    def _read(self, path: str) -> Iterator:
+        reader = self._pa.ipc.open_file(path)
+        return (reader.get_batch(i) for i in range(reader.num_record_batches))
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    name: str
+    extension: str
+    mime: str
+    writer: Callable[[str, List[str]], ResultWriter]
+
+
+EXPORT_FORMATS: Dict[str, ExportFormat] = {
+    fmt.name: fmt
+    for fmt in [
+        ExportFormat("csv", ".csv", "text/csv", CSVWriter),
+        ExportFormat(
+            "csv.gz", ".csv.gz", "application/gzip",
+            lambda path, columns: CSVWriter(path, columns, compression="gzip")
+        ),
+        ExportFormat(
+            "csv.zst", ".csv.zst", "application/zstd",
+            lambda path, columns: CSVWriter(path, columns, compression="zstd")
+        ),
+        ExportFormat("parquet", ".parquet", "application/vnd.apache.parquet", ParquetWriter),
+        ExportFormat("arrow", ".arrow", "application/vnd.apache.arrow.file", ArrowIPCWriter),
+        ExportFormat(
+            "feather", ".feather", "application/vnd.apache.arrow.file", ArrowIPCWriter
+        ),
+    ]
+}
+
+
+def get_format(name: str) -> ExportFormat:
+    try:
+        return EXPORT_FORMATS[name.lower()]
+    except KeyError:
+        raise ValueError(
+            f"Unknown export format '{name}', expected one of {', '.join(EXPORT_FORMATS)}"
+        )
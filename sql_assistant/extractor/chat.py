@@ -1,49 +1,75 @@
-from typing import List
+from typing import Any, Dict, List, Optional
 from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
 from langgraph.graph import StateGraph, END
 from langgraph.graph.state import CompiledStateGraph
 
-from sql_assistant.chains import Chains
 from sql_assistant.query import SQLQuery, QueryStatus
-from sql_assistant.config import FILEPATH
+from sql_assistant.config import EXPORT_FORMAT
 from sql_assistant.state import AgentState
 from sql_assistant.base import SQLBaseAgent
 
 
 class ExtractorAgent(SQLBaseAgent):
+    stream_nodes = ("format_output",)
+
     def __init__(self):
         super().__init__()
-        self.chains = Chains()
         self.graph = self._build_graph()
 
         # self.graph.get_graph().draw_mermaid_png(output_file_path="graph.png")
 
 
+    def _format_output_inputs(self, state: AgentState) -> Dict[str, Any]:
+        return {
+            "row_count": state['result'].row_count,
+            "columns": ", ".join(state['result'].columns),
+            "endpoint": state['result'].output
+        }
+
+
+    def _format_failure(self, state: AgentState) -> AgentState:
+        if state['query'].status == QueryStatus.FAILED:
+            state['messages'].append(AIMessage(content="Query execution failed. Please check if your query makes sense or try to reformulate it."))
+
+        return state
+
+
     def _format_output(self, state: AgentState) -> AgentState:
         """Format the final output message with download link."""
         if state['query'].status == QueryStatus.COMPLETE and state['result'] is not None:
-            output_message = self.chains.file_output_chain.invoke({
-                "row_count": len(state['result']),
-                "columns": ", ".join(state['result'].columns),
-                "endpoint": FILEPATH
-            })
+            output_message = self.chains.file_output_chain.invoke(
+                self._format_output_inputs(state)
+            )
             state['messages'].append(AIMessage(content=output_message))
+            return state
 
-        elif state['query'].status == QueryStatus.FAILED:
-            state['messages'].append(AIMessage(content="Query execution failed. Please check if your query makes sense or try to reformulate it."))
+        return self._format_failure(state)
 
-        return state
+
+    async def _aformat_output(self, state: AgentState) -> AgentState:
+        if state['query'].status == QueryStatus.COMPLETE and state['result'] is not None:
+            output_message = await self.chains.file_output_chain.ainvoke(
+                self._format_output_inputs(state)
+            )
+            state['messages'].append(AIMessage(content=output_message))
+            return state
+
+        return self._format_failure(state)
 
 
     def _build_graph(self) -> CompiledStateGraph:
         workflow = StateGraph(AgentState)
 
-        workflow.add_node("generate", self._generate)
-        workflow.add_node("review", self._review)
-        workflow.add_node("correct", self._correct)
-        workflow.add_node("execute", self._extract)
-        workflow.add_node("format_output", self._format_output)
+        workflow.add_node("compact", self._node(self._compact_memory))
+        workflow.add_node("generate", self._node(self._generate, self._agenerate))
+        workflow.add_node("review", self._node(self._review, self._areview))
+        workflow.add_node("correct", self._node(self._correct, self._acorrect))
+        workflow.add_node("execute", self._node(self._extract))
+        workflow.add_node(
+            "format_output", self._node(self._format_output, self._aformat_output)
+        )
 
+        workflow.add_edge("compact", "generate")
         workflow.add_edge("generate", "review")
         workflow.add_conditional_edges(
             "review",
@@ -59,29 +85,76 @@ class ExtractorAgent(SQLBaseAgent):
         workflow.add_conditional_edges(
             "execute",
             lambda x: x['query'].status,
-            {QueryStatus.NEEDS_REVIEW: "review", QueryStatus.COMPLETE: "format_output"}
+            {
+                QueryStatus.NEEDS_REVIEW: "review",
+                QueryStatus.COMPLETE: "format_output",
+                QueryStatus.FAILED: "format_output",
+                QueryStatus.BUDGET_EXCEEDED: END
+            }
         )
         workflow.add_edge("format_output", END)
-        workflow.set_entry_point("generate")
+        workflow.set_entry_point("compact")
+
+        return workflow.compile(checkpointer=self.checkpointer)
+
 
-        return workflow.compile()
+    def _initial_state(
+        self, user_request: str, export_format: str = EXPORT_FORMAT
+    ) -> AgentState:
+        return AgentState(
+            messages=[HumanMessage(content=user_request)],
+            query=SQLQuery(text="", status=QueryStatus.PENDING),
+            export_format=export_format,
+            result=None,
+            analysis=None
+        )
 
 
-    def run(self, user_request: str) -> List[BaseMessage]:
+    def execute(
+        self,
+        user_request: str,
+        export_format: str = EXPORT_FORMAT,
+        thread_id: Optional[str] = None,
+    ) -> AgentState:
+        """Run the graph for the user request and return the final state."""
+        return self.invoke(user_request, thread_id, export_format=export_format)
+
+
+    async def aexecute(
+        self,
+        user_request: str,
+        export_format: str = EXPORT_FORMAT,
+        thread_id: Optional[str] = None,
+    ) -> AgentState:
+        """Async version of execute, LLM waits of concurrent requests overlap."""
+        return await self.ainvoke(user_request, thread_id, export_format=export_format)
+
+
+    def run(
+        self,
+        user_request: str,
+        export_format: str = EXPORT_FORMAT,
+        thread_id: Optional[str] = None,
+    ) -> List[BaseMessage]:
         """
         Execute a SQL query based on the user request and return messages.
-        Results will be available via the download endpoint.
+        Results will be available via the download endpoint in the requested export format.
         """
-        initial_state = AgentState(
-            messages=[HumanMessage(content=user_request)],
-            query=SQLQuery(text="", status=QueryStatus.PENDING)
-        )
+        final_state = self.execute(user_request, export_format, thread_id)
+        return final_state['messages'][-1].content
+
 
-        final_state = self.graph.invoke(initial_state)
+    async def arun(
+        self,
+        user_request: str,
+        export_format: str = EXPORT_FORMAT,
+        thread_id: Optional[str] = None,
+    ) -> List[BaseMessage]:
+        final_state = await self.aexecute(user_request, export_format, thread_id)
         return final_state['messages'][-1].content
 
 
 if __name__ == "__main__":
     agent = ExtractorAgent()
     result = agent.run("How many items each customer has bought?")
-    print(result)
\ No newline at end of file
+    print(result)
@@ -1,50 +1,77 @@
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.responses import FileResponse
-from pathlib import Path
-from pydantic import BaseModel
-
-from sql_assistant.extractor.chat import SQLAgent
-from sql_assistant.config import DOWNLOAD_ENDPOINT
+from typing import Optional
 
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+from pydantic import BaseModel
 
-class Config:
-    RESULTS_DIR = Path("query-results")
-    
-    @classmethod
-    def ensure_results_dir(cls):
-        cls.RESULTS_DIR.mkdir(exist_ok=True)
-    
-    @classmethod
-    def get_results_path(cls):
-        return cls.RESULTS_DIR / "query_results.csv"
+from sql_assistant.extractor.chat import ExtractorAgent
+from sql_assistant.config import DOWNLOAD_ENDPOINT, EXPORT_FORMAT, PLOTLY_JS_ENDPOINT
+from sql_assistant.export import ExportFormat, get_format
+from sql_assistant.metrics import metrics
+from sql_assistant.result_store import ResultStore
 
 
 class QueryRequest(BaseModel):
     query: str
+    export_format: str = EXPORT_FORMAT
+    # Requests of a same thread share their conversation, a repeated one resumes
+    thread_id: Optional[str] = None
+
+
+def resolve_format(export_format: str) -> ExportFormat:
+    try:
+        return get_format(export_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 app = FastAPI()
+store = ResultStore()
+# Built once and shared, requests overlap through ExtractorAgent.aexecute
+agent = ExtractorAgent()
+
 
 @app.post("/query")
-async def execute_query(request: QueryRequest, agent: SQLAgent = Depends()):
-    messages = agent.run(request.query)
-    return {"messages": [m.dict() for m in messages]}
-
-@app.get(DOWNLOAD_ENDPOINT)
-async def download_query_results():
-    file_path = Config.get_results_path()
-    if not file_path.exists():
+async def execute_query(request: QueryRequest):
+    fmt = resolve_format(request.export_format)
+    final_state = await agent.aexecute(request.query, fmt.name, request.thread_id)
+
+    result = final_state.get('result')
+    key = result.artifact_key if result is not None else None
+    return {
+        "message": final_state['messages'][-1].content,
+        "download": f"{DOWNLOAD_ENDPOINT}/{key}" if key else None
+    }
+
+
+@app.get(DOWNLOAD_ENDPOINT + "/{key}")
+async def download_query_results(key: str):
+    artifact = store.lookup(key)
+    if artifact is None:
         raise HTTPException(
             status_code=404, 
             detail="No query results available. Please execute a query first."
         )
+    fmt = get_format(artifact.export_format)
     return FileResponse(
-        path=file_path, 
-        filename="query_results.csv", 
-        media_type="text/csv"
+        path=artifact.path, 
+        filename=f"query_results{fmt.extension}", 
+        media_type=fmt.mime
     )
 
-# Initialize on startup
-@app.on_event("startup")
-async def startup_event():
-    Config.ensure_results_dir()
\ No newline at end of file
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get(PLOTLY_JS_ENDPOINT)
+async def plotly_js():
+    # Analyst reports load plotly.js from here rather than from a CDN
+    from sql_assistant.analyst.report import plotly_bundle
+
+    return FileResponse(
+        path=plotly_bundle(),
+        media_type="application/javascript",
+        headers={"Cache-Control": "public, max-age=86400"}
+    )
@@ -1,8 +1,16 @@
+import streamlit as st
+
 from sql_assistant.front_layer import AgentUI
 from sql_assistant.extractor.chat import ExtractorAgent
 
 
+@st.cache_resource
+def load_agent() -> ExtractorAgent:
+    # Streamlit re-runs this script on every interaction, build the agent once
+    return ExtractorAgent()
+
+
 if __name__=='__main__':
-    agent = ExtractorAgent()
+    agent = load_agent()
     ui = AgentUI(agent)
     ui.app()
\ No newline at end of file
@@ -1,18 +1,96 @@
+import uuid
+
 import streamlit as st
+import streamlit.components.v1 as components
 
 from pathlib import Path
 from langchain_core.messages import AIMessage, HumanMessage
 
 from sql_assistant.extractor.chat import ExtractorAgent
-from sql_assistant.config import FILEPATH
+from sql_assistant.config import EXPORT_FORMAT
+from sql_assistant.export import EXPORT_FORMATS, get_format
+from sql_assistant.metrics import (
+    CHAIN_SECONDS, CHAIN_TOKENS, DB_ROWS, DB_SECONDS, NODE_SECONDS, REQUESTS
+)
 
 class AgentUI:
     def __init__(self, llm_agent):
         self.agent = llm_agent
 
 
-    def run_agent(self, user_query):
-        return self.agent.run(user_query)
+    def stream_agent(self, user_query, export_format=EXPORT_FORMAT):
+        # One graph thread per browser session, a rerun resumes the interrupted request
+        thread_id = st.session_state.setdefault("thread_id", uuid.uuid4().hex)
+        if isinstance(self.agent, ExtractorAgent):
+            return self.agent.stream(user_query, thread_id, export_format=export_format)
+        return self.agent.stream(user_query, thread_id)
+
+
+    @staticmethod
+    def show(content: str):
+        """Markdown answers, or the analyst's HTML report in an iframe."""
+        if content.lstrip().startswith("<html"):
+            components.html(content, height=900, scrolling=True)
+        else:
+            st.write(content)
+
+
+    def run_agent(self, user_query, export_format=EXPORT_FORMAT):
+        """Render node progress and answer tokens as they arrive, return the final answer."""
+        status = st.status("Thinking...", expanded=False)
+        placeholder = st.empty()
+        answer = ""
+
+        for event in self.stream_agent(user_query, export_format):
+            if event.kind == "token":
+                answer += event.content
+                placeholder.markdown(answer + "▌")
+            elif event.kind == "node" and event.node not in self.agent.stream_nodes:
+                status.update(label=f"{event.node.replace('_', ' ').capitalize()}...")
+                status.write(event.content)
+            elif event.kind == "final":
+                final_state = event.state
+
+        status.update(label="Done", state="complete")
+        placeholder.empty()
+
+        if isinstance(self.agent, ExtractorAgent):
+            # Point the download button at this request's own artifact
+            result = final_state.get('result')
+            st.session_state.artifact = result.output if result is not None else None
+        return final_state['messages'][-1].content
+
+
+    def metrics_panel(self):
+        """Per node, chain and database latency of this process."""
+        with st.sidebar.expander("Metrics"):
+            for title, histogram, unit in [
+                ("Graph nodes", NODE_SECONDS, "s"),
+                ("Chains", CHAIN_SECONDS, "s"),
+                ("Tokens per call", CHAIN_TOKENS, ""),
+                ("Database", DB_SECONDS, "s"),
+                ("Rows returned", DB_ROWS, ""),
+            ]:
+                series = histogram.series()
+                if not series:
+                    continue
+                st.markdown(f"**{title}**")
+                st.table([
+                    {
+                        "series": " / ".join(key),
+                        "count": stats["count"],
+                        f"mean{unit}": round(stats["mean"], 3),
+                        f"p50{unit}": round(stats["p50"], 3),
+                        f"p95{unit}": round(stats["p95"], 3),
+                    }
+                    for key, stats in sorted(series.items())
+                ])
+
+            requests = {
+                status: REQUESTS.value(agent=self.agent.name, status=status)
+                for status in ("complete", "failed", "budget_exceeded")
+            }
+            st.markdown(f"**Requests**: {requests}")
 
 
     def app(self):
@@ -29,11 +107,20 @@ class AgentUI:
         for message in st.session_state.chat_history:
             if isinstance(message, AIMessage):
                 with st.chat_message("AI"):
-                    st.write(message.content)
+                    self.show(message.content)
             elif isinstance(message, HumanMessage):
                 with st.chat_message("Human"):
                     st.write(message.content)
 
+        export_format = EXPORT_FORMAT
+        if isinstance(self.agent, ExtractorAgent):
+            formats = list(EXPORT_FORMATS)
+            with st.sidebar:
+                export_format = st.selectbox(
+                    "Export format", formats, index=formats.index(EXPORT_FORMAT)
+                )
+        fmt = get_format(export_format)
+
         user_query = st.chat_input("Enter your query:")
         if user_query is not None and user_query != "":
             st.session_state.chat_history.append(HumanMessage(content=user_query))
@@ -43,29 +130,31 @@ class AgentUI:
 
             if user_query:
                 with st.chat_message("AI"):
-                    with st.spinner("Thinking..."):
-                        # Get the response from the agent
-                        ai_response = self.run_agent(user_query)
+                    # Stream the response from the agent
+                    ai_response = self.run_agent(user_query, export_format)
 
-                        # Display the response in the chat
-                        st.write(ai_response)
+                    # Display the response in the chat
+                    self.show(ai_response)
 
-                        # Wrap the response in an AIMessage object and save it
-                        ai_message = AIMessage(content=ai_response)
-                        st.session_state.chat_history.append(ai_message)
+                    # Wrap the response in an AIMessage object and save it
+                    ai_message = AIMessage(content=ai_response)
+                    st.session_state.chat_history.append(ai_message)
 
-                if Path(FILEPATH).exists():
-                    with open(FILEPATH, "rb") as file:
+                artifact = st.session_state.get("artifact")
+                if artifact and Path(artifact).exists():
+                    with open(artifact, "rb") as file:
                         btn = st.download_button(
                             label="Download file",
                             data=file,
-                            file_name="results.csv",
-                            mime="text/csv"
+                            file_name=f"results{fmt.extension}",
+                            mime=fmt.mime
                         )
 
             else:
                 st.write("Please enter a query")
         
+        self.metrics_panel()
+
         with st.sidebar:
             st.header("About")
             st.write(
@@ -0,0 +1,180 @@
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+from sql_assistant.config import QUERY_MAX_SCAN_ROWS, QUERY_STEP_BUDGET, QUERY_TIME_BUDGET_S
+from sql_assistant.query import subquery
+
+# VM instructions between two calls of the progress handler
+PROGRESS_INTERVAL = 10_000
+
+_TABLE_REF = re.compile(
+    r"(?:\bfrom|\bjoin|,)\s*([\w\"`\[\]]+)(?:\s+(?:as\s+)?"
+    r"(?!on\b|using\b|where\b|join\b|from\b|"
+    r"left\b|inner\b|cross\b|natural\b|group\b|order\b|limit\b)(\w+))?",
+    re.IGNORECASE
+)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a query is refused up front or interrupted by its execution budget."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+@dataclass
+class PlanReport:
+    full_scans: List[str] = field(default_factory=list)
+    cross_joins: List[List[str]] = field(default_factory=list)
+    estimated_rows: Optional[int] = None
+
+
+class QueryGuard:
+    """
+    Cost guard around query execution.
+    Inspects EXPLAIN QUERY PLAN for full scans and cartesian products, adds a LIMIT
+    where the caller asks for one and interrupts execution through sqlite's
+    progress handler once the wall-clock or VM step budget is spent.
+    """
+
+    def __init__(
+        self,
+        time_budget_s: Optional[float] = QUERY_TIME_BUDGET_S,
+        step_budget: Optional[int] = QUERY_STEP_BUDGET,
+        max_scan_rows: Optional[int] = QUERY_MAX_SCAN_ROWS
+    ):
+        self.time_budget_s = time_budget_s
+        self.step_budget = step_budget
+        self.max_scan_rows = max_scan_rows
+
+
+    @staticmethod
+    def limit(query: str, row_limit: Optional[int]) -> str:
+        """
+        Wrap the query in a LIMIT. A LIMIT of its own stays inside the subquery, so the
+        effective limit is the smaller of the two.
+        """
+        query = query.strip().rstrip(";").strip()
+        if row_limit is None:
+            return query
+        return f"SELECT * FROM {subquery(query)} LIMIT {int(row_limit)}"
+
+
+    @staticmethod
+    def _aliases(query: str) -> Dict[str, str]:
+        aliases = {}
+        for table, alias in _TABLE_REF.findall(query):
+            table = table.strip('"`[]')
+            aliases[table.lower()] = table
+            if alias:
+                aliases[alias.lower()] = table
+        return aliases
+
+
+    @staticmethod
+    def _table_rows(conn: sqlite3.Connection, table: str) -> Optional[int]:
+        try:
+            # max(rowid) is an index lookup, close enough to the row count for a guard
+            return conn.execute(f'SELECT max(rowid) FROM "{table}"').fetchone()[0] or 0
+        except sqlite3.Error:
+            return None
+
+
+    def inspect(self, conn: sqlite3.Connection, query: str) -> PlanReport:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+        aliases = self._aliases(query)
+        report = PlanReport()
+
+        scans_by_parent: Dict[int, List[str]] = {}
+        for _, parent, _, detail in plan:
+            # A SCAN visits every row, covering index or not, only SEARCH is bounded
+            match = re.match(r"SCAN (\w+)", detail)
+            if not match:
+                continue
+            table = aliases.get(match.group(1).lower(), match.group(1))
+            report.full_scans.append(table)
+            scans_by_parent.setdefault(parent, []).append(table)
+
+        for tables in scans_by_parent.values():
+            if len(tables) < 2:
+                continue
+            report.cross_joins.append(tables)
+
+            estimate = 1
+            for table in tables:
+                rows = self._table_rows(conn, table)
+                if rows is None:
+                    estimate = None
+                    break
+                estimate *= max(rows, 1)
+            if estimate is not None:
+                report.estimated_rows = max(report.estimated_rows or 0, estimate)
+
+        return report
+
+
+    def check(self, conn: sqlite3.Connection, query: str) -> PlanReport:
+        """Refuse queries whose plan joins full scans into too many rows."""
+        report = self.inspect(conn, query)
+        if (
+            self.max_scan_rows is not None
+            and report.estimated_rows is not None
+            and report.estimated_rows > self.max_scan_rows
+        ):
+            tables = " x ".join(report.cross_joins[0])
+            raise QueryBudgetExceeded(
+                f"cartesian join of {tables} would scan ~{report.estimated_rows:,} rows"
+            )
+        return report
+
+
+    @contextmanager
+    def budget(self, conn: sqlite3.Connection) -> Iterator["Budget"]:
+        """Interrupt whatever runs on conn inside the block once the budget is spent."""
+        budget = Budget(self.time_budget_s)
+
+        def handler() -> int:
+            budget.steps += PROGRESS_INTERVAL
+            if budget.deadline is not None and time.monotonic() > budget.deadline:
+                budget.reason = f"time budget of {self.time_budget_s}s exceeded"
+                return 1
+            if self.step_budget is not None and budget.steps > self.step_budget:
+                budget.reason = f"step budget of {self.step_budget:,} VM steps exceeded"
+                return 1
+            return 0
+
+        conn.set_progress_handler(handler, PROGRESS_INTERVAL)
+        try:
+            yield budget
+        except Exception as e:
+            # pandas wraps the sqlite 'interrupted' error, rely on the handler's record
+            if budget.reason is not None:
+                raise QueryBudgetExceeded(budget.reason) from e
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+
+
+class Budget:
+    """Running budget of one guarded block, as handed out by QueryGuard.budget."""
+
+    def __init__(self, time_budget_s: Optional[float]):
+        self.deadline = time.monotonic() + time_budget_s if time_budget_s else None
+        self.steps = 0
+        self.reason: Optional[str] = None
+
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        """Leave the time spent inside the block, e.g. writing rows out, off the clock."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            if self.deadline is not None:
+                self.deadline += time.monotonic() - start
@@ -0,0 +1,34 @@
+import uuid
+from typing import Any, Dict, Optional
+
+from sql_assistant.cache import ResultCache
+from sql_assistant.config import RESULT_HANDLES_MAX_MB
+
+
+class ResultHandles:
+    """
+    In-process store of query results referenced from AgentState by key.
+    The state only carries the handle (QueryResult.handle), so it stays small to
+    copy and checkpoint however many rows the query returned. Handles are evicted
+    LRU by size, a missing one means the result must be fetched again.
+    """
+
+    def __init__(self, max_mb: int = RESULT_HANDLES_MAX_MB):
+        self.cache = ResultCache(max_mb * 1024 * 1024)
+
+
+    def put(self, data: Any) -> str:
+        key = uuid.uuid4().hex
+        self.cache.put(key, "", data)
+        return key
+
+
+    def get(self, key: Optional[str]) -> Optional[Any]:
+        return self.cache.get(key, "") if key is not None else None
+
+
+    def stats(self) -> Dict[str, int]:
+        return self.cache.stats()
+
+
+handles = ResultHandles()
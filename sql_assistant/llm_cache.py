@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from sql_assistant.config import LLM_CACHE_FLUSH_HITS, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_PATH
+from sql_assistant.metrics import CHAIN_SECONDS, CHAIN_TOKENS
+from sql_assistant.schema_index import estimate_tokens
+
+
+class LLMCache:
+    """
+    On-disk cache of LLM responses backed by sqlite.
+    Entries are evicted least recently used first once max_entries is exceeded.
+    Access times of hits are kept in memory and written in one batch on the next
+    put or every flush_hits hits, so a hit costs a read only.
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        flush_hits: int = LLM_CACHE_FLUSH_HITS
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_hits = flush_hits
+        self._lock = threading.Lock()
+        self._accessed: Dict[str, float] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)"
+        )
+        self._conn.commit()
+
+
+    @staticmethod
+    def key(model_id: str, prompt: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps(
+            {"model": model_id, "prompt": prompt, "params": params}, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= self.flush_hits:
+                self._flush_accessed()
+                self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+
+    def _flush_accessed(self):
+        """Write the buffered access times, the caller holds the lock and commits."""
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE llm_cache SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._accessed.items()]
+            )
+            self._accessed.clear()
+
+
+    def flush(self):
+        with self._lock:
+            self._flush_accessed()
+            self._conn.commit()
+
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        with self._lock:
+            # Eviction below orders by access time, bring it up to date first
+            self._flush_accessed()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            self._conn.execute(
+                """DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+
+    def clear(self):
+        with self._lock:
+            self._accessed.clear()
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+class CachedChain(Runnable[Dict[str, Any], str]):
+    """
+    prompt | llm | StrOutputParser() with the LLM round trip served from an LLMCache.
+    The key covers the model id, the rendered prompt and the generation parameters.
+    Pass bypass_cache=True to invoke to force a fresh generation.
+    Every invocation is timed and the token usage of every LLM call recorded.
+    """
+
+    def __init__(
+        self,
+        prompt: BasePromptTemplate,
+        llm: Runnable,
+        cache: Optional[LLMCache],
+        model_id: str,
+        params: Dict[str, Any],
+        name: str = "chain"
+    ):
+        self.prompt = prompt
+        self.llm = llm
+        self.cache = cache
+        self.model_id = model_id
+        self.params = params
+        self.name = name
+        self.parser = StrOutputParser()
+
+
+    def _record_usage(self, prompt: str, message: BaseMessage) -> str:
+        response = self.parser.invoke(message)
+        # Not every backend reports usage, fall back to the schema pruning estimate
+        usage = getattr(message, "usage_metadata", None) or {}
+        CHAIN_TOKENS.observe(
+            usage.get("input_tokens") or estimate_tokens(prompt),
+            chain=self.name,
+            kind="prompt",
+        )
+        CHAIN_TOKENS.observe(
+            usage.get("output_tokens") or estimate_tokens(response),
+            chain=self.name,
+            kind="completion",
+        )
+        return response
+
+
+    def invoke(
+        self,
+        input: Dict[str, Any],
+        config: Optional[RunnableConfig] = None,
+        bypass_cache: bool = False,
+        **kwargs: Any
+    ) -> str:
+        start = time.perf_counter()
+        prompt_value = self.prompt.invoke(input, config)
+        prompt = prompt_value.to_string()
+
+        key = None
+        if self.cache is not None and not bypass_cache:
+            key = self.cache.key(self.model_id, prompt, self.params)
+            response = self.cache.get(key)
+            if response is not None:
+                CHAIN_SECONDS.observe(
+                    time.perf_counter() - start, chain=self.name, cached="true"
+                )
+                return response
+
+        response = self._record_usage(prompt, self.llm.invoke(prompt_value, config))
+        if key is not None:
+            self.cache.put(key, response)
+
+        CHAIN_SECONDS.observe(time.perf_counter() - start, chain=self.name, cached="false")
+        return response
+
+
+    async def ainvoke(
+        self,
+        input: Dict[str, Any],
+        config: Optional[RunnableConfig] = None,
+        bypass_cache: bool = False,
+        **kwargs: Any
+    ) -> str:
+        start = time.perf_counter()
+        prompt_value = await self.prompt.ainvoke(input, config)
+        prompt = prompt_value.to_string()
+
+        key = None
+        if self.cache is not None and not bypass_cache:
+            key = self.cache.key(self.model_id, prompt, self.params)
+            response = await asyncio.to_thread(self.cache.get, key)
+            if response is not None:
+                CHAIN_SECONDS.observe(
+                    time.perf_counter() - start, chain=self.name, cached="true"
+                )
+                return response
+
+        response = self._record_usage(prompt, await self.llm.ainvoke(prompt_value, config))
+        if key is not None:
+            await asyncio.to_thread(self.cache.put, key, response)
+
+        CHAIN_SECONDS.observe(time.perf_counter() - start, chain=self.name, cached="false")
+        return response
@@ -0,0 +1,399 @@
+import asyncio
+import copy
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+from sql_assistant.config import (
+    LOCAL_BATCH_WAIT_MS,
+    LOCAL_MAX_BATCH,
+    LOCAL_MIN_PREFIX_TOKENS,
+    LOCAL_PREFIX_CACHE,
+    LOCAL_QUANTIZE,
+    LOCAL_THREADS,
+)
+
+ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+def to_chat(messages: List[BaseMessage]) -> List[Dict[str, str]]:
+    """LangChain messages as the role/content dicts of a tokenizer chat template."""
+    return [{"role": ROLES.get(m.type, "user"), "content": str(m.content)} for m in messages]
+
+
+def truncate(text: str, stop: Optional[List[str]]) -> str:
+    for word in stop or ():
+        index = text.find(word)
+        if index != -1:
+            text = text[:index]
+    return text
+
+
+@dataclass
+class _Request:
+    messages: List[Dict[str, str]]
+    options: Tuple[float, int]  # temperature, max_new_tokens
+    stop: Optional[List[str]]
+    on_token: Optional[Callable[[str], None]]
+    future: Future = field(default_factory=Future)
+    # Set by the worker, the tokenizer is only used from its thread
+    ids: List[int] = field(default_factory=list)
+    prefix_len: int = 0
+
+
+class _BatchStreamer:
+    """transformers streamer calling each request's on_token with its newly decoded text."""
+
+    def __init__(self, tokenizer: Any, requests: List[_Request]):
+        self.tokenizer = tokenizer
+        self.requests = requests
+        self.ids: List[List[int]] = [[] for _ in requests]
+        self.sent = [""] * len(requests)
+        self.prompt = True
+
+
+    def put(self, value: Any):
+        # The first call carries the prompt, every following one a token per row
+        if self.prompt:
+            self.prompt = False
+            return
+        for row, token in enumerate(value.reshape(-1).tolist()):
+            request = self.requests[row]
+            if request.on_token is None:
+                continue
+            self.ids[row].append(token)
+            text = self.tokenizer.decode(self.ids[row], skip_special_tokens=True)
+            # Incomplete multi-byte characters decode to U+FFFD until the next token
+            if text.endswith("�"):
+                continue
+            request.on_token(text[len(self.sent[row]):])
+            self.sent[row] = text
+
+
+    def end(self):
+        pass
+
+
+class LocalEngine:
+    """
+    A causal LM on CPU through transformers, shared by every chat client of the model.
+    Linear layers are quantized to int8 (dynamic quantization) unless quantize is "".
+    Requests are queued and run in micro-batches: the worker waits batch_wait_ms for
+    up to max_batch requests and generates the ones with the same prompt prefix and
+    options together. The KV cache of the leading system message (the schema of the
+    generate/review/correct prompts) is kept for the last prefix_cache prefixes, so a
+    prompt only pays for the tokens after it.
+    Weights are loaded on the first request.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        quantize: str = LOCAL_QUANTIZE,
+        threads: int = LOCAL_THREADS,
+        prefix_cache: int = LOCAL_PREFIX_CACHE,
+        min_prefix_tokens: int = LOCAL_MIN_PREFIX_TOKENS,
+        max_batch: int = LOCAL_MAX_BATCH,
+        batch_wait_ms: float = LOCAL_BATCH_WAIT_MS
+    ):
+        self.model_id = model_id
+        self.quantize = quantize
+        self.threads = threads
+        self.prefix_cache = prefix_cache
+        self.min_prefix_tokens = min_prefix_tokens
+        self.max_batch = max_batch
+        self.batch_wait_ms = batch_wait_ms
+        self.model = None
+        self.tokenizer = None
+        self._load_lock = threading.Lock()
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._prefixes: "OrderedDict[Tuple[int, ...], Any]" = OrderedDict()
+        self._stats = {
+            "requests": 0,
+            "batches": 0,
+            "prefix_hits": 0,
+            "prefix_misses": 0,
+            "prefix_tokens_reused": 0,
+        }
+
+
+    def _load(self):
+        with self._load_lock:
+            if self.model is not None:
+                return
+            try:
+                import torch
+                from transformers import AutoModelForCausalLM, AutoTokenizer
+            except ImportError as e:
+                raise ImportError(
+                    "The local LLM backend needs torch and transformers, "
+                    "pip install -r requirements.local.txt"
+                ) from e
+
+            if self.threads:
+                torch.set_num_threads(self.threads)
+            tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+            if tokenizer.pad_token_id is None:
+                tokenizer.pad_token = tokenizer.eos_token
+            model = AutoModelForCausalLM.from_pretrained(self.model_id, dtype=torch.float32)
+            model.eval()
+            if self.quantize == "int8":
+                model = torch.ao.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+            elif self.quantize:
+                raise ValueError(
+                    f"Unknown quantization {self.quantize!r}, expected 'int8' or ''"
+                )
+
+            self.tokenizer = tokenizer
+            self.model = model
+            self._worker = threading.Thread(
+                target=self._work, name=f"local-llm-{self.model_id}", daemon=True
+            )
+            self._worker.start()
+
+
+    def _encode(self, messages: List[Dict[str, str]]) -> Tuple[List[int], int]:
+        """Prompt token ids and the length of their cacheable prefix, the system message."""
+        def ids(conversation, generation_prompt):
+            text = self.tokenizer.apply_chat_template(
+                conversation, add_generation_prompt=generation_prompt, tokenize=False
+            )
+            return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+        prompt = ids(messages, True)
+        if len(messages) < 2 or messages[0]["role"] != "system" or not self.prefix_cache:
+            return prompt, 0
+
+        # Templates may close a conversation differently, only the common tokens are shared
+        prefix = ids(messages[:1], False)
+        length = 0
+        for a, b in zip(prefix, prompt):
+            if a != b:
+                break
+            length += 1
+        # At least one token must be left for the model to process
+        length = min(length, len(prompt) - 1)
+        return prompt, length if length >= self.min_prefix_tokens else 0
+
+
+    def submit(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_new_tokens: int,
+        stop: Optional[List[str]] = None,
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> Future:
+        """Queue a chat completion, the future resolves to the generated text."""
+        self._load()
+        request = _Request(messages, (temperature, max_new_tokens), stop, on_token)
+        self._queue.put(request)
+        return request.future
+
+
+    def generate(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_new_tokens: int,
+        stop: Optional[List[str]] = None
+    ) -> str:
+        return self.submit(messages, temperature, max_new_tokens, stop).result()
+
+
+    def _work(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait_ms / 1000
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            groups: Dict[Any, List[_Request]] = {}
+            for request in batch:
+                try:
+                    request.ids, request.prefix_len = self._encode(request.messages)
+                except Exception as e:
+                    request.future.set_exception(e)
+                    continue
+                key = (tuple(request.ids[:request.prefix_len]), request.options)
+                groups.setdefault(key, []).append(request)
+            for group in groups.values():
+                try:
+                    self._run(group)
+                except Exception as e:
+                    for request in group:
+                        if not request.future.done():
+                            request.future.set_exception(e)
+
+
+    def _prefix_kv(self, prefix: List[int]) -> Any:
+        """KV cache of the prefix tokens, computed on the first request using them."""
+        import torch
+
+        key = tuple(prefix)
+        kv = self._prefixes.get(key)
+        if kv is not None:
+            self._prefixes.move_to_end(key)
+            self._stats["prefix_hits"] += 1
+            self._stats["prefix_tokens_reused"] += len(prefix)
+            return kv
+
+        self._stats["prefix_misses"] += 1
+        with torch.no_grad():
+            kv = self.model(input_ids=torch.tensor([prefix]), use_cache=True).past_key_values
+        self._prefixes[key] = kv
+        while len(self._prefixes) > self.prefix_cache:
+            self._prefixes.popitem(last=False)
+        return kv
+
+
+    def _run(self, group: List[_Request]):
+        import torch
+
+        self._stats["requests"] += len(group)
+        self._stats["batches"] += 1
+        prefix_len = group[0].prefix_len
+        prefix = group[0].ids[:prefix_len]
+        suffixes = [request.ids[prefix_len:] for request in group]
+        width = max(map(len, suffixes))
+        pad = self.tokenizer.pad_token_id
+
+        # Suffixes are left padded after the shared prefix, the attention mask skips
+        # the padding and position ids follow the mask
+        input_ids = torch.tensor([prefix + [pad] * (width - len(s)) + s for s in suffixes])
+        attention_mask = torch.tensor(
+            [[1] * prefix_len + [0] * (width - len(s)) + [1] * len(s) for s in suffixes]
+        )
+        temperature, max_new_tokens = group[0].options
+        kwargs: Dict[str, Any] = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "max_new_tokens": max_new_tokens,
+            "do_sample": temperature > 0,
+            "pad_token_id": pad,
+        }
+        if temperature > 0:
+            kwargs["temperature"] = temperature
+        if prefix_len:
+            # generate appends to the cache, the stored prefix must stay untouched
+            kv = copy.deepcopy(self._prefix_kv(prefix))
+            if len(group) > 1:
+                kv.batch_repeat_interleave(len(group))
+            kwargs["past_key_values"] = kv
+        if any(request.on_token is not None for request in group):
+            kwargs["streamer"] = _BatchStreamer(self.tokenizer, group)
+
+        with torch.no_grad():
+            output = self.model.generate(**kwargs)
+        for request, row in zip(group, output[:, input_ids.shape[1]:]):
+            text = self.tokenizer.decode(row, skip_special_tokens=True)
+            request.future.set_result(truncate(text, request.stop))
+
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self._stats, "prefixes": len(self._prefixes), "queued": self._queue.qsize()
+        }
+
+
+class LocalChatModel(BaseChatModel):
+    """
+    LangChain chat model answering from a LocalEngine. Concurrent calls, sync from
+    threads or async, are batched together by the engine.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model_id: str
+    engine: LocalEngine
+    temperature: float = 0.1
+    max_new_tokens: int = 1024
+
+
+    @property
+    def _llm_type(self) -> str:
+        return "local"
+
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "model_id": self.model_id,
+            "quantize": self.engine.quantize,
+            "temperature": self.temperature,
+            "max_new_tokens": self.max_new_tokens,
+        }
+
+
+    def _submit(
+        self, messages: List[BaseMessage], stop: Optional[List[str]], on_token=None
+    ) -> Future:
+        return self.engine.submit(
+            to_chat(messages), self.temperature, self.max_new_tokens, stop, on_token
+        )
+
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        text = self._submit(messages, stop).result()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        future = await asyncio.to_thread(self._submit, messages, stop)
+        text = await asyncio.wrap_future(future)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        tokens: "queue.Queue[Optional[str]]" = queue.Queue()
+        future = self._submit(messages, stop, tokens.put)
+        future.add_done_callback(lambda _: tokens.put(None))
+
+        # Stop words are only cut from the final text, the stream ends at the first one
+        streamed = ""
+        for token in iter(tokens.get, None):
+            streamed += token
+            if truncate(streamed, stop) != streamed:
+                break
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        future.result()
@@ -0,0 +1,132 @@
+from typing import Any, List, Optional
+
+from langchain_core.messages import (
+    AIMessage, BaseMessage, HumanMessage, RemoveMessage, SystemMessage
+)
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+from sql_assistant.config import (
+    MEMORY_SUMMARY, MEMORY_SUMMARY_TOKENS, MEMORY_TOKEN_BUDGET, MEMORY_WINDOW
+)
+from sql_assistant.schema_index import estimate_tokens
+
+SUMMARY_NAME = "summary"
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+# Bookkeeping messages of the graph nodes, dropped from extractive summaries
+_NOISE = ("Review Feedback:", "Execution successful", "Error executing query")
+_SQL = ("Generated SQL Query:", "Corrected SQL Query:")
+
+
+def is_summary(message: BaseMessage) -> bool:
+    return isinstance(message, SystemMessage) and message.name == SUMMARY_NAME
+
+
+def message_tokens(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return estimate_tokens(content)
+
+
+class MemoryPolicy:
+    """
+    Bounds the conversation kept in AgentState.messages and sent to prompts.
+    compact folds every message older than the last window into one summary
+    message, extractive or written by the LLM ("llm"). prompt_messages is what a
+    chain sees: the summary plus the most recent messages fitting token_budget.
+    """
+
+    def __init__(
+        self,
+        chains: Any = None,
+        window: int = MEMORY_WINDOW,
+        token_budget: int = MEMORY_TOKEN_BUDGET,
+        summary: Optional[str] = MEMORY_SUMMARY,
+        summary_tokens: int = MEMORY_SUMMARY_TOKENS
+    ):
+        self.chains = chains
+        self.window = window
+        self.token_budget = token_budget
+        self.summary = summary
+        self.summary_tokens = summary_tokens
+
+
+    @staticmethod
+    def _split(messages: List[BaseMessage]):
+        summary = next((m for m in messages if is_summary(m)), None)
+        return summary, [m for m in messages if not is_summary(m)]
+
+
+    def prompt_messages(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """Summary and the latest messages within window and token budget, oldest first."""
+        summary, turns = self._split(messages)
+        budget = self.token_budget - (message_tokens(summary) if summary is not None else 0)
+
+        kept = []
+        for message in reversed(turns[-self.window:]):
+            budget -= message_tokens(message)
+            # The latest message is always sent, even over budget
+            if budget < 0 and kept:
+                break
+            kept.append(message)
+        kept.reverse()
+        return ([summary] if summary is not None else []) + kept
+
+
+    def compact(self, messages: List[BaseMessage]) -> Optional[List[BaseMessage]]:
+        """
+        Update of the messages channel replacing everything older than the window
+        with a summary, None while the conversation still fits.
+        """
+        summary, turns = self._split(messages)
+        if len(turns) <= self.window:
+            return None
+
+        # Cut at a turn boundary: the first user message inside the window, or the
+        # start of the current turn when that turn alone is longer than the window
+        humans = [i for i, m in enumerate(turns) if isinstance(m, HumanMessage)]
+        start = len(turns) - self.window
+        cut = next((i for i in humans if i >= start), None)
+        if cut is None:
+            cut = max((i for i in humans if i < start), default=start)
+        if cut == 0:
+            return None
+
+        old, recent = turns[:cut], turns[cut:]
+        update: List[BaseMessage] = [RemoveMessage(id=REMOVE_ALL_MESSAGES)]
+        if self.summary:
+            previous = summary.content[len(SUMMARY_HEADER):] if summary is not None else ""
+            text = self._summarize(previous, old)
+            update.append(SystemMessage(content=SUMMARY_HEADER + text, name=SUMMARY_NAME))
+        return update + recent
+
+
+    def _summarize(self, previous: str, messages: List[BaseMessage]) -> str:
+        if self.summary == "llm" and self.chains is not None:
+            return self.chains.summarize.invoke({"summary": previous, "messages": messages})
+        return self._extractive(previous, messages)
+
+
+    def _extractive(self, previous: str, messages: List[BaseMessage]) -> str:
+        """User questions, the SQL that answered them and the start of each answer."""
+        lines = previous.splitlines() if previous else []
+        for message in messages:
+            content = message.content
+            if not isinstance(content, str):
+                content = str(content)
+            if content.lstrip().startswith("<html"):
+                continue
+            # One line per entry, the summary is split on lines when it is trimmed
+            content = " ".join(content.split())
+            if isinstance(message, HumanMessage):
+                lines.append(f"User: {content}")
+            elif isinstance(message, AIMessage) and not content.startswith(_NOISE):
+                prefix = next((p for p in _SQL if content.startswith(p)), None)
+                if prefix is not None:
+                    lines.append(f"SQL: {content[len(prefix):].strip()}")
+                else:
+                    lines.append(f"Assistant: {content[:300]}")
+
+        # Oldest lines go first once the summary is over its own budget
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
@@ -0,0 +1,91 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator
+
+from sql_assistant.config import DB_CACHE_SIZE, DB_MMAP_SIZE
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of read-only sqlite connections.
+    Each thread lazily opens one connection and reuses it for every later call.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        mmap_size: int = DB_MMAP_SIZE,
+        cache_size: int = DB_CACHE_SIZE
+    ):
+        self.db_path = db_path
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: Dict[int, sqlite3.Connection] = {}
+
+        self.opened = 0
+        self.reused = 0
+        self.closed = 0
+
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+        # Connections never leave their thread, the flag only allows close() from others
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+
+    def _prune_dead_threads(self):
+        alive = {thread.ident for thread in threading.enumerate()}
+        for ident in [ident for ident in self._connections if ident not in alive]:
+            self._connections.pop(ident).close()
+            self.closed += 1
+
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = getattr(self._local, "conn", None)
+
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._prune_dead_threads()
+                self._connections[threading.get_ident()] = conn
+                self.opened += 1
+        else:
+            with self._lock:
+                self.reused += 1
+
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+
+
+    def close(self):
+        """Close every pooled connection, they will be reopened on demand."""
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+                self.closed += 1
+            self._connections.clear()
+        self._local = threading.local()
+
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "open": len(self._connections),
+                "opened": self.opened,
+                "reused": self.reused,
+                "closed": self.closed,
+            }
@@ -1,9 +1,15 @@
-import pandas as pd
+from __future__ import annotations
+
+import re
 
 from enum import Enum
-from typing import Optional
+from typing import TYPE_CHECKING, List, Optional
 from dataclasses import dataclass
 
+if TYPE_CHECKING:
+    # Only for annotations, pandas is imported by the code that builds a DataFrame
+    import pandas as pd
+
 
 class QueryStatus(Enum):
     PENDING = "pending"
@@ -13,6 +19,7 @@ class QueryStatus(Enum):
     READY = "ready"
     INVALID = "invalid"
     FAILED = "failed"
+    BUDGET_EXCEEDED = "budget_exceeded"
     COMPLETE = "complete"
 
 
@@ -30,4 +37,41 @@ class QueryResult:
     data: Optional[pd.DataFrame] = None
     output: Optional[str] = None
     error: Optional[str] = None
-    row_count: Optional[int] = None
\ No newline at end of file
+    row_count: Optional[int] = None
+    columns: Optional[List[str]] = None
+    artifact_key: Optional[str] = None
+    # Key of the rows in sql_assistant.handles, instead of inline data
+    handle: Optional[str] = None
+
+
+# String literals and quoted identifiers, kept verbatim by normalize_sql
+QUOTED_SQL = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\])")
+
+
+def normalize_sql(query: str) -> str:
+    """Collapse whitespace and lowercase everything outside of quoted text."""
+    parts = QUOTED_SQL.split(query.strip().rstrip(";").strip())
+    normalized = [
+        part if i % 2 else re.sub(r"\s+", " ", part).lower()
+        for i, part in enumerate(parts)
+    ]
+    return "".join(normalized).strip()
+
+
+def subquery(query: str) -> str:
+    """
+    The query in parentheses, to select from it as a derived table.
+    The closing parenthesis goes on its own line, a trailing -- comment would swallow it.
+    """
+    return f"({query.strip().rstrip(';').strip()}\n)"
+
+
+_CODE_FENCE = re.compile(r"```(?:sql)?\s*(.*?)\s*```", re.IGNORECASE | re.DOTALL)
+
+
+def clean_sql(text: str) -> str:
+    """Extract the SQL statement from an LLM reply, dropping markdown code fences."""
+    match = _CODE_FENCE.search(text)
+    if match:
+        text = match.group(1)
+    return text.strip().strip("`").strip()
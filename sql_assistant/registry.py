@@ -0,0 +1,143 @@
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Hashable, Tuple
+
+from langchain_core.runnables import Runnable
+
+from sql_assistant.chains import Chains
+from sql_assistant.checkpoint import SqliteCheckpointer
+from sql_assistant.config import (
+    CHECKPOINT_PATH, LLM_CACHE_ENABLED, LLM_CACHE_PATH, chat, path_db
+)
+from sql_assistant.database import DatabaseConnection
+from sql_assistant.llm_cache import LLMCache
+from sql_assistant.utils import load_llm_chat
+
+
+class Registry:
+    """
+    Process-wide store of the expensive shared resources: chat clients, chain sets,
+    LLM caches, graph checkpointers and database connections. Each one is built lazily
+    on first use and exactly once per key, so agents and sessions only hold references
+    to them.
+    A chat client owns its inference client and with it the HTTP session, sharing
+    the client shares the connection pool across every agent using the model.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._items: Dict[Tuple[str, Hashable], Any] = {}
+        self.builds: Dict[str, int] = {}
+
+
+    @staticmethod
+    def _params_key(params: Dict[str, Any]) -> str:
+        return json.dumps(params, sort_keys=True, default=str)
+
+
+    def _get(self, kind: str, key: Hashable, build):
+        item = self._items.get((kind, key))
+        if item is not None:
+            return item
+
+        with self._lock:
+            item = self._items.get((kind, key))
+            if item is None:
+                item = build()
+                self._items[(kind, key)] = item
+                self.builds[kind] = self.builds.get(kind, 0) + 1
+            return item
+
+
+    def llm(self, model: str = chat, **params: Any) -> Runnable:
+        return self._get(
+            "llm", (model, self._params_key(params)), lambda: load_llm_chat(model, **params)
+        )
+
+
+    def register_llm(self, llm: Runnable, model: str = chat, **params: Any):
+        """Serve llm for model and params instead of building one, e.g. a scripted model."""
+        with self._lock:
+            self._items[("llm", (model, self._params_key(params)))] = llm
+            # Chain sets of the model were built around the previous client
+            stale = [key for key in self._items if key[0] == "chains" and key[1][0] == model]
+            for key in stale:
+                del self._items[key]
+
+
+    def local_engine(self, model: str = chat):
+        from sql_assistant.local_llm import LocalEngine
+
+        return self._get("local_engine", model, lambda: LocalEngine(model))
+
+
+    def llm_cache(self, path: str = LLM_CACHE_PATH) -> LLMCache:
+        return self._get("llm_cache", path, lambda: LLMCache(path))
+
+
+    def chains(
+        self, model: str = chat, use_cache: bool = LLM_CACHE_ENABLED, **params: Any
+    ) -> Chains:
+        return self._get(
+            "chains",
+            (model, use_cache, self._params_key(params)),
+            lambda: Chains(
+                model,
+                use_cache,
+                llm=self.llm(model, **params),
+                cache=self.llm_cache() if use_cache else None,
+                params=params
+            )
+        )
+
+
+    def checkpointer(self, path: str = CHECKPOINT_PATH) -> SqliteCheckpointer:
+        return self._get("checkpointer", path, lambda: SqliteCheckpointer(path))
+
+
+    def database(self, db_path: Path = path_db) -> DatabaseConnection:
+        return self._get("database", str(db_path), lambda: DatabaseConnection(db_path))
+
+
+    def clear(self):
+        with self._lock:
+            for (kind, _), item in self._items.items():
+                if kind == "database":
+                    item.pool.close()
+                elif kind == "checkpointer":
+                    item.close()
+            self._items.clear()
+
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries: Dict[str, int] = {}
+            for kind, _ in self._items:
+                entries[kind] = entries.get(kind, 0) + 1
+            return {"entries": entries, "builds": dict(self.builds)}
+
+
+_registry = Registry()
+
+
+def get_registry() -> Registry:
+    return _registry
+
+
+def get_llm(model: str = chat, **params: Any) -> Runnable:
+    return _registry.llm(model, **params)
+
+
+def get_chains(
+    model: str = chat, use_cache: bool = LLM_CACHE_ENABLED, **params: Any
+) -> Chains:
+    return _registry.chains(model, use_cache, **params)
+
+
+def get_database(db_path: Path = path_db) -> DatabaseConnection:
+    return _registry.database(db_path)
+
+
+def get_checkpointer(path: str = CHECKPOINT_PATH) -> SqliteCheckpointer:
+    return _registry.checkpointer(path)
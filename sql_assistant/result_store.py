@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sql_assistant.config import RESULT_STORE_MAX_MB, RESULT_STORE_TTL_SECONDS, RESULTS_DIR
+from sql_assistant.export import get_format
+from sql_assistant.query import QueryResult, normalize_sql
+
+
+@dataclass
+class Artifact:
+    key: str
+    path: str
+    export_format: str
+    row_count: int
+    columns: List[str]
+    created_at: float
+    size: int
+
+    def to_result(self) -> QueryResult:
+        return QueryResult(
+            success=True,
+            output=self.path,
+            row_count=self.row_count,
+            columns=self.columns,
+            artifact_key=self.key
+        )
+
+
+class ResultStore:
+    """
+    Content-addressed store of extracted query results.
+    Every artifact lives next to a JSON sidecar holding its metadata, the sidecar
+    mtime doubles as last access time for the size based (LRU) eviction.
+    """
+
+    def __init__(
+        self,
+        root: str = RESULTS_DIR,
+        max_mb: int = RESULT_STORE_MAX_MB,
+        ttl_seconds: int = RESULT_STORE_TTL_SECONDS
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_mb * 1024 * 1024
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.root.mkdir(parents=True, exist_ok=True)
+
+
+    @staticmethod
+    def key(query: str, db_version: str, export_format: str) -> str:
+        payload = "\n".join([normalize_sql(query), db_version, export_format])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+
+    def path_for(self, key: str, export_format: str) -> str:
+        return str(self.root / f"{key}{get_format(export_format).extension}")
+
+
+    def _meta_path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+
+    def _expired(self, artifact: Artifact, now: float) -> bool:
+        return now - artifact.created_at > self.ttl_seconds
+
+
+    def _read(self, meta_path: Path) -> Optional[Artifact]:
+        try:
+            return Artifact(**json.loads(meta_path.read_text()))
+        except (OSError, ValueError, TypeError):
+            return None
+
+
+    def _remove(self, key: str, artifact: Optional[Artifact] = None):
+        paths = [self._meta_path(key)]
+        if artifact is not None:
+            paths.append(Path(artifact.path))
+        for path in paths:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+    def lookup(self, key: str) -> Optional[Artifact]:
+        """Return the live artifact stored under key, refreshing its access time."""
+        meta_path = self._meta_path(key)
+        artifact = self._read(meta_path)
+
+        with self._lock:
+            if artifact is None or not Path(artifact.path).exists():
+                self.misses += 1
+                return None
+
+            if self._expired(artifact, time.time()):
+                self._remove(key, artifact)
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+        os.utime(meta_path)
+        return artifact
+
+
+    def put(self, key: str, result: QueryResult, export_format: str) -> Artifact:
+        """Register a freshly written result file and evict if the store grew too large."""
+        artifact = Artifact(
+            key=key,
+            path=result.output,
+            export_format=export_format,
+            row_count=result.row_count,
+            columns=result.columns,
+            created_at=time.time(),
+            size=os.path.getsize(result.output)
+        )
+
+        meta_path = self._meta_path(key)
+        tmp_path = meta_path.with_suffix(".json.part")
+        tmp_path.write_text(json.dumps(asdict(artifact)))
+        os.replace(tmp_path, meta_path)
+
+        self.evict(keep=key)
+        return artifact
+
+
+    def evict(self, keep: Optional[str] = None):
+        """
+        Drop expired artifacts, then the least recently used ones until under max size.
+        The artifact under keep, the one just registered, is never dropped, even when it
+        alone exceeds the max size: its caller is about to hand it out.
+        """
+        now = time.time()
+        with self._lock:
+            entries = []
+            for meta_path in self.root.glob("*.json"):
+                artifact = self._read(meta_path)
+                if artifact is None:
+                    continue
+                if self._expired(artifact, now) or not Path(artifact.path).exists():
+                    self._remove(artifact.key, artifact)
+                    self.evictions += 1
+                    continue
+                try:
+                    entries.append((meta_path.stat().st_mtime, artifact))
+                except FileNotFoundError:
+                    continue
+
+            total = sum(artifact.size for _, artifact in entries)
+            for _, artifact in sorted(entries, key=lambda entry: entry[0]):
+                if total <= self.max_bytes:
+                    break
+                if artifact.key == keep:
+                    continue
+                self._remove(artifact.key, artifact)
+                self.evictions += 1
+                total -= artifact.size
+
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,142 @@
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count used for prompt budgeting, about 4 characters per token."""
+    return math.ceil(len(text) / 4)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split identifiers and prose into lowercase words plus character trigrams.
+    Trigrams let 'customer' match 'customers' or 'CustomerId' without a stemmer.
+    """
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    words = [word.lower() for word in re.findall(r"[A-Za-z0-9]+", text)]
+
+    tokens = []
+    for word in words:
+        tokens.append(word)
+        padded = f"^{word}$"
+        tokens.extend(f"#{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return tokens
+
+
+def load_descriptions(path: str) -> Dict[str, str]:
+    """
+    Read table descriptions, one table per line as 'name: description'.
+    Lines holding only a table name are accepted and carry no description.
+    """
+    descriptions = {}
+    if not Path(path).exists():
+        return descriptions
+
+    for line in Path(path).read_text().splitlines():
+        name, _, description = line.partition(":")
+        if name.strip():
+            descriptions[name.strip()] = description.strip()
+    return descriptions
+
+
+class SchemaIndex:
+    """
+    BM25 index over table names, column names and table descriptions.
+    Used to keep only the tables relevant to a request in the prompt schema.
+    """
+
+    k1 = 1.5
+    b = 0.75
+    # Hits scoring below this fraction of the best match are treated as noise
+    min_score_ratio = 0.25
+
+    def __init__(
+        self,
+        catalog: Dict[str, List[Tuple[str, str]]],
+        foreign_keys: Dict[str, List[str]],
+        table_tokens: Dict[str, int],
+        descriptions: Optional[Dict[str, str]] = None
+    ):
+        self.foreign_keys = foreign_keys
+        self.table_tokens = table_tokens
+        descriptions = descriptions or {}
+
+        self.documents: Dict[str, Counter] = {}
+        for table, columns in catalog.items():
+            # Table names weigh more than any single column
+            text = " ".join([table] * 3 + [name for name, _ in columns])
+            text += " " + descriptions.get(table, "")
+            self.documents[table] = Counter(tokenize(text))
+
+        self.avg_length = (
+            sum(sum(doc.values()) for doc in self.documents.values()) / len(self.documents)
+            if self.documents else 0
+        )
+        document_frequency = Counter(
+            token for doc in self.documents.values() for token in doc
+        )
+        n_docs = len(self.documents)
+        self.idf = {
+            token: math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for token, df in document_frequency.items()
+        }
+
+
+    def score(self, request: str) -> Dict[str, float]:
+        query = Counter(tokenize(request))
+        scores = {}
+        for table, doc in self.documents.items():
+            length = sum(doc.values())
+            score = 0.0
+            for token in query:
+                tf = doc.get(token, 0)
+                if not tf:
+                    continue
+                norm = tf + self.k1 * (1 - self.b + self.b * length / self.avg_length)
+                score += self.idf[token] * tf * (self.k1 + 1) / norm
+            scores[table] = score
+        return scores
+
+
+    def neighbours(self, table: str) -> List[str]:
+        """Tables referenced by, or referencing, the given table."""
+        referenced = self.foreign_keys.get(table, [])
+        referencing = [name for name, refs in self.foreign_keys.items() if table in refs]
+        return [*referenced, *referencing]
+
+
+    def select(
+        self,
+        request: str,
+        top_k: int,
+        token_budget: int
+    ) -> List[str]:
+        """
+        Top-k tables for the request followed by their foreign key neighbours,
+        kept in that priority order while their rendered schema fits the budget.
+        """
+        ranked = sorted(
+            ((score, table) for table, score in self.score(request).items() if score > 0),
+            reverse=True
+        )
+        if not ranked:
+            return []
+
+        threshold = ranked[0][0] * self.min_score_ratio
+        hits = [table for score, table in ranked[:top_k] if score >= threshold]
+
+        candidates = list(hits)
+        for table in hits:
+            candidates.extend(n for n in self.neighbours(table) if n not in candidates)
+
+        selected, used = [], 0
+        for table in candidates:
+            cost = self.table_tokens.get(table, 0)
+            if used + cost > token_budget and selected:
+                continue
+            selected.append(table)
+            used += cost
+        return selected
@@ -1,7 +1,7 @@
 from enum import Enum
 from pathlib import Path
-from dataclasses import dataclass
-from typing import List, Annotated, Optional, Annotated
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Annotated, Optional, Annotated
 from typing_extensions import TypedDict
 from langgraph.graph.message import AnyMessage, add_messages
 
@@ -13,6 +13,23 @@ class AgentState(TypedDict):
     query: SQLQuery
     result: Optional[QueryResult] = None
     user_input: Optional[str] = None
+    export_format: Optional[str] = None
+    schema: Optional[str] = None
+    schema_tokens_saved: Optional[int] = None
+    analysis: Optional["AnalysisResult"] = None
+
+
+@dataclass
+class StreamEvent:
+    """
+    Item yielded by SQLBaseAgent.stream.
+    kind is "node" once a graph node finished, "token" for every LLM chunk of the
+    final answer and "final" with the complete state at the end of the run.
+    """
+    kind: str
+    node: Optional[str] = None
+    content: str = ""
+    state: Optional[AgentState] = None
 
 
 class AnalysisType(Enum):
@@ -20,6 +37,24 @@ class AnalysisType(Enum):
     CORRELATION = "correlation"
     DISTRIBUTION = "distribution"
     AGGREGATION = "aggregation"
+    DESCRIPTIVE = "descriptive"
+
+
+@dataclass
+class AnalysisResult:
+    """
+    Output of the analyst's analyze node.
+    reductions lists every data reduction applied before plotting, empty when the
+    figure shows all rows.
+    """
+    analysis_type: AnalysisType
+    visualization: str
+    description: str
+    figure: Any
+    row_count: int
+    columns: List[str]
+    reductions: List[str] = field(default_factory=list)
+    plan: Dict[str, str] = field(default_factory=dict)
 
 
 class AnalysisContext:
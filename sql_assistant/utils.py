@@ -1,14 +1,55 @@
-from langchain_huggingface import HuggingFaceEndpoint, ChatHuggingFace
+from sql_assistant.config import LLM_BACKEND
 
 
-def load_llm_chat(model):
+# Generation parameters shared by every chat client, part of the LLM cache key
+LLM_PARAMS = {
+    "temperature": 0.1,
+    "max_new_tokens": 1024,
+    "return_full_text": False,
+}
+
+
+def load_huggingface_chat(model, **params):
+    # Imported on first use, the HF client is slow to import and few entry points need it
+    from langchain_huggingface import HuggingFaceEndpoint, ChatHuggingFace
+
     llm = HuggingFaceEndpoint(
         repo_id=model,
         task="text-generation",
-        temperature=0.1,
-        max_new_tokens=1024,
-        return_full_text=False,
+        **{**LLM_PARAMS, **params},
     )
     chat = ChatHuggingFace(llm=llm)
 
-    return chat
\ No newline at end of file
+    return chat
+
+
+def load_llm_chat(model, backend=None, **params):
+    """Chat client of the configured backend, see LLM_BACKEND."""
+    backend = backend or LLM_BACKEND
+    if backend == "huggingface":
+        return load_huggingface_chat(model, **params)
+
+    if backend == "local":
+        from sql_assistant.local_llm import LocalChatModel
+        from sql_assistant.registry import get_registry
+
+        params = {**LLM_PARAMS, **params}
+        # One engine, and one copy of the weights, per model whatever the parameters
+        return LocalChatModel(
+            model_id=model,
+            engine=get_registry().local_engine(model),
+            temperature=params["temperature"],
+            max_new_tokens=params["max_new_tokens"]
+        )
+
+    if backend == "cassette":
+        from sql_assistant.cassette import Cassette, CassetteChatModel
+        from sql_assistant.config import CASSETTE_MODE
+
+        # Only a recording session needs the live endpoint behind the cassette
+        inner = load_huggingface_chat(model, **params) if CASSETTE_MODE == "record" else None
+        return CassetteChatModel(model_id=model, cassette=Cassette(), inner=inner)
+
+    raise ValueError(
+        f"Unknown LLM backend {backend!r}, expected 'huggingface', 'local' or 'cassette'"
+    )
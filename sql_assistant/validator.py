@@ -0,0 +1,96 @@
+import difflib
+import re
+import sqlite3
+from dataclasses import dataclass
+from enum import Enum
+from typing import List, Optional
+
+from sql_assistant.database import DatabaseConnection
+from sql_assistant.query import QUOTED_SQL, clean_sql
+
+
+class Verdict(Enum):
+    VALID = "valid"
+    INVALID = "invalid"
+    ERROR = "error"
+    AMBIGUOUS = "ambiguous"
+
+
+@dataclass
+class ValidationResult:
+    verdict: Verdict
+    feedback: str
+    plan: Optional[List[tuple]] = None
+
+
+class SQLValidator:
+    """
+    Deterministic check of a generated query against the live schema.
+    sqlite prepares the statement for EXPLAIN QUERY PLAN, which resolves every
+    table, column and function, so a VALID verdict means the query will run.
+    Queries it cannot judge on its own are AMBIGUOUS and go to the LLM review.
+    """
+
+    def __init__(self, db: DatabaseConnection):
+        self.db = db
+
+
+    def _tables(self) -> List[str]:
+        return list(self.db.get_catalog())
+
+
+    def _columns(self) -> List[str]:
+        catalog = self.db.get_catalog()
+        return sorted({name for columns in catalog.values() for name, _ in columns})
+
+
+    def _hint(self, error: str) -> str:
+        match = re.search(r"no such (table|column): ([\w.]+)", error)
+        if not match:
+            return ""
+
+        kind, name = match.group(1), match.group(2).split(".")[-1]
+        names = self._tables() if kind == "table" else self._columns()
+        close = difflib.get_close_matches(name, names, n=3, cutoff=0.6)
+        return f" Did you mean: {', '.join(close)}?" if close else ""
+
+
+    def _unresolved_double_quotes(self, query: str) -> List[str]:
+        # sqlite silently reads an unknown "identifier" as a string literal
+        names = {name.lower() for name in [*self._tables(), *self._columns()]}
+        quoted = [part[1:-1] for part in QUOTED_SQL.findall(query) if part.startswith('"')]
+        return [text for text in quoted if text.lower() not in names]
+
+
+    def validate(self, query: str) -> ValidationResult:
+        text = clean_sql(query).rstrip(";").strip()
+
+        if not text or "invalid request" in text.lower():
+            return ValidationResult(Verdict.INVALID, "INVALID: no query was generated.")
+
+        unquoted = "".join(QUOTED_SQL.split(text)[::2])
+        if ";" in unquoted:
+            return ValidationResult(Verdict.AMBIGUOUS, "Multiple statements.")
+
+        try:
+            plan = self.db.explain(text)
+        except sqlite3.Error as e:
+            return ValidationResult(Verdict.ERROR, f"INCORRECT: {e}.{self._hint(str(e))}")
+
+        keyword = unquoted.split(None, 1)[0].lower()
+        if keyword not in ("select", "with"):
+            return ValidationResult(
+                Verdict.AMBIGUOUS, f"Not a read query ({keyword}).", plan
+            )
+
+        unresolved = self._unresolved_double_quotes(text)
+        if unresolved:
+            return ValidationResult(
+                Verdict.AMBIGUOUS,
+                f"Double quoted text {', '.join(unresolved)} is not a known identifier.",
+                plan
+            )
+
+        return ValidationResult(
+            Verdict.VALID, "CORRECT: query compiles against the schema.", plan
+        )